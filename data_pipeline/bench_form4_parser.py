@@ -0,0 +1,258 @@
+"""
+Form 4 parser benchmark.
+
+Compares edgar_fetcher.parse_form4_xml (one pass over each transaction's
+children) against the previous implementation (one full scan per table
+plus several subtree scans per transaction) on a corpus of filings, checks
+that both return identical trades, and prints timings. Most of the time
+left is ElementTree parsing the document, which is also reported.
+
+Usage:
+    python bench_form4_parser.py                 # synthetic corpus
+    python bench_form4_parser.py --corpus DIR    # every *.xml file in DIR
+    python bench_form4_parser.py --from-store    # documents in the local EDGAR store
+"""
+
+import argparse
+import glob
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from xml.etree import ElementTree as ET
+
+from edgar_fetcher import parse_form4_xml
+
+
+# ---------------------------------------------------------------------------
+# Reference implementation (pre single-pass parser)
+# ---------------------------------------------------------------------------
+
+def _find_text(node, suffix: str):
+    """Helper to find text in a node by tag suffix."""
+    for e in node.iter():
+        if e.tag.endswith(suffix) and e.text:
+            return e.text.strip()
+    return None
+
+
+def legacy_parse_form4_xml(xml_text: str, ticker: str, filing_date):
+    """Previous parser, kept as the benchmark/correctness reference."""
+    trades = []
+    
+    try:
+        root = ET.fromstring(xml_text)
+    except Exception as e:
+        print(f"[WARN] XML parse error: {e}")
+        return trades
+    
+    insider_name = _find_text(root, "rptOwnerName") or "Unknown Insider"
+    
+    # Look in nonDerivativeTable and derivativeTable for transactions
+    for table_suffix in ("nonDerivativeTable", "derivativeTable"):
+        for table in root.iter():
+            if not table.tag.endswith(table_suffix):
+                continue
+            
+            for tx in table:
+                tag = tx.tag.split("}")[-1]
+                if tag not in ("nonDerivativeTransaction", "derivativeTransaction"):
+                    continue
+                
+                # Extract transaction code P / S / M
+                code = _find_text(tx, "transactionCode")
+                if not code:
+                    continue
+                code = code.strip().upper()
+                if code not in ("P", "S", "M"):  # P=Purchase, S=Sale, M=Option exercise
+                    continue
+                
+                # Extract shares from transactionShares/value
+                shares_txt = None
+                for e in tx.iter():
+                    t = e.tag.split("}")[-1]
+                    if t in ("transactionShares", "shares"):
+                        for v in e.iter():
+                            if v.tag.endswith("value") and v.text:
+                                shares_txt = v.text.strip()
+                                break
+                    if shares_txt:
+                        break
+                
+                if not shares_txt:
+                    continue
+                
+                try:
+                    shares = int(float(shares_txt.replace(",", "")))
+                except Exception:
+                    continue
+                
+                # Extract transaction date (or fall back to filing_date)
+                date_txt = None
+                for e in tx.iter():
+                    if e.tag.endswith("transactionDate"):
+                        for v in e.iter():
+                            if v.tag.endswith("value") and v.text:
+                                date_txt = v.text.strip()
+                                break
+                    if date_txt:
+                        break
+                
+                if date_txt:
+                    try:
+                        tx_date = datetime.strptime(date_txt, "%Y-%m-%d").date()
+                    except Exception:
+                        tx_date = filing_date
+                else:
+                    tx_date = filing_date
+                
+                # Map code to buy/sell
+                if code in ("P", "M"):
+                    tx_type = "buy"
+                else:
+                    tx_type = "sell"
+                
+                trades.append({
+                    "ticker": ticker,
+                    "insider_name": insider_name,
+                    "transaction_type": tx_type,
+                    "shares": shares,
+                    "transaction_date": tx_date.isoformat(),
+                    "filing_date": filing_date.isoformat(),
+                })
+    
+    return trades
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def _synthetic_transaction(rng: random.Random, derivative: bool) -> str:
+    prefix = "derivative" if derivative else "nonDerivative"
+    code = rng.choice("PSMAGF")
+    day = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    shares = rng.randrange(1, 500000)
+    underlying = ""
+    if derivative:
+        underlying = (
+            "<underlyingSecurity><underlyingSecurityTitle><value>Common Stock</value>"
+            f"</underlyingSecurityTitle><underlyingSecurityShares><value>{shares}</value>"
+            "</underlyingSecurityShares></underlyingSecurity>"
+        )
+    return (
+        f"<{prefix}Transaction>"
+        "<securityTitle><value>Common Stock</value></securityTitle>"
+        f"<transactionDate><value>{day.isoformat()}</value></transactionDate>"
+        "<transactionCoding><transactionFormType>4</transactionFormType>"
+        f"<transactionCode>{code}</transactionCode><equitySwapInvolved>0</equitySwapInvolved>"
+        "</transactionCoding>"
+        f"<transactionAmounts><transactionShares><value>{shares}</value></transactionShares>"
+        f"<transactionPricePerShare><value>{rng.uniform(5, 900):.2f}</value>"
+        "</transactionPricePerShare>"
+        "<transactionAcquiredDisposedCode><value>A</value></transactionAcquiredDisposedCode>"
+        "</transactionAmounts>"
+        f"{underlying}"
+        "<postTransactionAmounts><sharesOwnedFollowingTransaction>"
+        f"<value>{shares * 3}</value></sharesOwnedFollowingTransaction></postTransactionAmounts>"
+        "<ownershipNature><directOrIndirectOwnership><value>D</value>"
+        "</directOrIndirectOwnership></ownershipNature>"
+        f"</{prefix}Transaction>"
+    )
+
+
+def synthetic_corpus(count: int, transactions: int, seed: int = 4) -> list[str]:
+    """Build `count` Form 4 documents with `transactions` rows each."""
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(count):
+        non_deriv = "".join(_synthetic_transaction(rng, False) for _ in range(transactions // 2))
+        deriv = "".join(_synthetic_transaction(rng, True) for _ in range(transactions - transactions // 2))
+        docs.append(
+            '<?xml version="1.0"?>'
+            "<ownershipDocument><schemaVersion>X0508</schemaVersion>"
+            "<documentType>4</documentType><periodOfReport>2024-12-31</periodOfReport>"
+            "<issuer><issuerCik>0000320193</issuerCik><issuerTradingSymbol>AAPL</issuerTradingSymbol></issuer>"
+            "<reportingOwner><reportingOwnerId><rptOwnerCik>0001</rptOwnerCik>"
+            "<rptOwnerName>Doe Jane</rptOwnerName></reportingOwnerId></reportingOwner>"
+            f"<nonDerivativeTable>{non_deriv}</nonDerivativeTable>"
+            f"<derivativeTable>{deriv}</derivativeTable>"
+            "</ownershipDocument>"
+        )
+    return docs
+
+
+def file_corpus(directory: str) -> list[str]:
+    docs = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.xml"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            docs.append(f.read())
+    return docs
+
+
+def store_corpus() -> list[str]:
+    from edgar_store import EdgarStore
+
+    store = EdgarStore()
+    with store._lock:
+        accessions = [r[0] for r in store._conn.execute("SELECT accession FROM form4_documents")]
+    return [store.get_document(a) for a in accessions]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _time(parser, docs: list[str], repeat: int) -> float:
+    filing_date = date(2024, 12, 31)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for doc in docs:
+            parser(doc, "AAPL", filing_date)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Form 4 parser")
+    parser.add_argument("--corpus", help="directory of Form 4 XML files")
+    parser.add_argument("--from-store", action="store_true", help="use the local EDGAR document store")
+    parser.add_argument("--docs", type=int, default=20, help="synthetic documents")
+    parser.add_argument("--transactions", type=int, default=400, help="transactions per synthetic document")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        docs = file_corpus(args.corpus)
+    elif args.from_store:
+        docs = store_corpus()
+    else:
+        docs = synthetic_corpus(args.docs, args.transactions)
+
+    if not docs:
+        print("[WARN] Empty corpus")
+        return
+
+    filing_date = date(2024, 12, 31)
+    mismatches = 0
+    for doc in docs:
+        if parse_form4_xml(doc, "AAPL", filing_date) != legacy_parse_form4_xml(doc, "AAPL", filing_date):
+            mismatches += 1
+
+    size_mb = sum(len(d) for d in docs) / 1e6
+    print(f"[INFO] Corpus: {len(docs)} documents, {size_mb:.1f} MB")
+    print(f"[INFO] Output mismatches: {mismatches}")
+
+    parse_s = _time(lambda doc, *_: ET.fromstring(doc), docs, args.repeat)
+    legacy_s = _time(legacy_parse_form4_xml, docs, args.repeat)
+    current_s = _time(parse_form4_xml, docs, args.repeat)
+
+    print(f"[INFO] XML parsing alone: {parse_s:.3f}s")
+    print(f"[INFO] Previous parser:   {legacy_s:.3f}s (extraction {legacy_s - parse_s:.3f}s)")
+    print(f"[INFO] Current parser:    {current_s:.3f}s (extraction {current_s - parse_s:.3f}s, "
+          f"{legacy_s / current_s:.2f}x overall)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+insider_summary aggregation benchmark.
+
+Seeds a scratch schema in a local Postgres with tickers and insider trades,
+then compares the previous per-ticker loop (one SELECT + one upsert per
+ticker, summed in Python) against a single refresh_insider_summary() call
+from database_schema_insider_functions.sql. Both must produce identical
+summaries.
+
+Needs psycopg (v3) or psycopg2 and a database you may create schemas in:
+    python bench_insider_summary.py --dsn postgresql://localhost/postgres
+    python bench_insider_summary.py --tickers 3000 --trades 40 --measure value
+
+The scratch schema is dropped afterwards.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+    try:
+        import psycopg2
+    except ImportError:
+        psycopg2 = None
+
+SCHEMA = "bench_insider_summary"
+FUNCTIONS_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                             "database_schema_insider_functions.sql")
+
+# Same columns/constraints as database_schema.sql
+TABLES_SQL = """
+create table stocks (ticker text primary key);
+create table tickers (ticker text primary key);
+create table insider_transactions (
+  id bigserial primary key,
+  ticker text not null references stocks(ticker) on delete cascade,
+  insider_name text,
+  insider_title text,
+  transaction_date date,
+  transaction_type text check (transaction_type in ('buy', 'sell')),
+  shares integer,
+  price_per_share numeric,
+  total_value numeric,
+  filing_date date,
+  constraint insider_transactions_unique
+    unique (ticker, insider_name, transaction_date, transaction_type, shares)
+);
+create index idx_insider_ticker_date on insider_transactions(ticker, transaction_date desc);
+create table insider_summary (
+  ticker text primary key references stocks(ticker) on delete cascade,
+  buys_90d integer,
+  sells_90d integer,
+  total_bought_value_90d numeric,
+  total_sold_value_90d numeric,
+  net_activity_90d numeric,
+  verdict text,
+  updated_at timestamptz default now()
+);
+"""
+
+
+def connect(dsn: str):
+    if psycopg is not None:
+        return psycopg.connect(dsn, autocommit=True)
+    if psycopg2 is not None:
+        conn = psycopg2.connect(dsn)
+        conn.autocommit = True
+        return conn
+    raise SystemExit("[ERROR] psycopg or psycopg2 is required for this benchmark")
+
+
+def seed(cur, n_tickers: int, trades_per_ticker: int, idle_ratio: float, seed_value: int):
+    """Create the scratch schema and fill it. Returns the number of trades."""
+    rng = random.Random(seed_value)
+    cur.execute(f"drop schema if exists {SCHEMA} cascade")
+    cur.execute(f"create schema {SCHEMA}")
+    cur.execute(f"set search_path to {SCHEMA}, public")
+    cur.execute(TABLES_SQL)
+    with open(FUNCTIONS_SQL) as f:
+        cur.execute(f.read())
+
+    tickers = [f"T{i:05d}" for i in range(n_tickers)]
+    cur.executemany("insert into stocks (ticker) values (%s)", [(t,) for t in tickers])
+    cur.executemany("insert into tickers (ticker) values (%s)", [(t,) for t in tickers])
+
+    today = date.today()
+    rows = []
+    for ticker in tickers:
+        if rng.random() < idle_ratio:
+            continue
+        for i in range(trades_per_ticker):
+            shares = rng.randint(100, 50000)
+            price = round(rng.uniform(5, 500), 2)
+            # Spread over 180 days so half of the trades fall outside the window
+            day = today - timedelta(days=rng.randint(0, 180))
+            rows.append((ticker, f"Insider {i}", "Officer", day, rng.choice(("buy", "sell")),
+                         shares, price, round(shares * price, 2), day))
+    cur.executemany(
+        "insert into insider_transactions (ticker, insider_name, insider_title, transaction_date, "
+        "transaction_type, shares, price_per_share, total_value, filing_date) "
+        "values (%s, %s, %s, %s, %s, %s, %s, %s, %s) on conflict do nothing",
+        rows
+    )
+    cur.execute("analyze")
+    return len(rows)
+
+
+def legacy_refresh(cur, days: int, measure: str, threshold: float, all_tickers: bool) -> int:
+    """Previous approach: one query and one upsert per ticker, aggregated in Python."""
+    cutoff = date.today() - timedelta(days=days)
+    if all_tickers:
+        cur.execute("select ticker from tickers")
+    else:
+        cur.execute("select distinct ticker from insider_transactions where transaction_date >= %s",
+                    (cutoff,))
+    tickers = [r[0] for r in cur.fetchall()]
+
+    for ticker in tickers:
+        cur.execute(
+            "select transaction_type, shares, total_value from insider_transactions "
+            "where ticker = %s and transaction_date >= %s", (ticker, cutoff)
+        )
+        buys = sells = 0
+        bought = sold = 0
+        for tx_type, shares, value in cur.fetchall():
+            amount = shares if measure == "shares" else 1
+            if tx_type == "buy":
+                buys += amount
+                bought += value or 0
+            elif tx_type == "sell":
+                sells += amount
+                sold += value or 0
+
+        net = bought - sold if measure == "value" else buys - sells
+        verdict = ("accumulating" if net > threshold
+                   else "distributing" if net < -threshold else "neutral")
+        cur.execute(
+            "insert into insider_summary (ticker, buys_90d, sells_90d, total_bought_value_90d, "
+            "total_sold_value_90d, net_activity_90d, verdict, updated_at) "
+            "values (%s, %s, %s, %s, %s, %s, %s, now()) "
+            "on conflict (ticker) do update set buys_90d = excluded.buys_90d, "
+            "sells_90d = excluded.sells_90d, total_bought_value_90d = excluded.total_bought_value_90d, "
+            "total_sold_value_90d = excluded.total_sold_value_90d, "
+            "net_activity_90d = excluded.net_activity_90d, verdict = excluded.verdict, "
+            "updated_at = excluded.updated_at",
+            (ticker, buys, sells, bought, sold, net, verdict)
+        )
+    return len(tickers)
+
+
+def snapshot(cur) -> dict:
+    cur.execute("select ticker, buys_90d, sells_90d, total_bought_value_90d, total_sold_value_90d, "
+                "net_activity_90d, verdict from insider_summary")
+    return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insider_summary aggregation")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_PG_DSN") or "postgresql://localhost/postgres")
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--trades", type=int, default=30, help="trades per active ticker")
+    parser.add_argument("--idle", type=float, default=0.2, help="share of tickers without trades")
+    parser.add_argument("--measure", choices=("shares", "count", "value"), default="shares")
+    parser.add_argument("--threshold", type=float, default=0)
+    parser.add_argument("--all-tickers", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    conn = connect(args.dsn)
+    cur = conn.cursor()
+    try:
+        started = time.perf_counter()
+        trades = seed(cur, args.tickers, args.trades, args.idle, args.seed)
+        print(f"[INFO] Seeded {args.tickers} tickers / {trades} trades "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        legacy_count = legacy_refresh(cur, 90, args.measure, args.threshold, args.all_tickers)
+        legacy_s = time.perf_counter() - started
+        legacy = snapshot(cur)
+
+        cur.execute("truncate insider_summary")
+        started = time.perf_counter()
+        cur.execute("select refresh_insider_summary(%s, %s, %s, %s)",
+                    (90, args.measure, args.threshold, args.all_tickers))
+        set_count = cur.fetchone()[0]
+        set_s = time.perf_counter() - started
+        set_based = snapshot(cur)
+
+        mismatches = [t for t in legacy.keys() | set_based.keys() if legacy.get(t) != set_based.get(t)]
+        print(f"[INFO] Per-ticker loop: {legacy_count} tickers, {2 * legacy_count + 1} statements, "
+              f"{legacy_s * 1000:.0f} ms")
+        print(f"[INFO] refresh_insider_summary: {set_count} tickers, 1 statement, "
+              f"{set_s * 1000:.0f} ms ({legacy_s / set_s if set_s else 0:.1f}x)")
+        if mismatches:
+            print(f"[ERROR] {len(mismatches)} summaries differ, e.g. {sorted(mismatches)[:5]}")
+        else:
+            print(f"[OK] Summaries identical")
+    finally:
+        cur.execute(f"drop schema if exists {SCHEMA} cascade")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
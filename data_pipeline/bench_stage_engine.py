@@ -0,0 +1,182 @@
+"""
+Stage engine verification and benchmark.
+
+Runs the previous per-ticker calculate_stage implementations (the
+update_stocks/comprehensive copy and the update_all copy) and
+stage_engine.compute_stages on the same corpus, checks that every stage is
+identical and every MA agrees to MA_RTOL, and prints timings.
+
+Usage:
+    python bench_stage_engine.py                    # synthetic corpus
+    python bench_stage_engine.py --tickers 3000 --days 2500
+    python bench_stage_engine.py --from-store       # local OHLCV store
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from stage_engine import MIN_BARS_FULL, MIN_BARS_MA, compute_stages
+
+MA_RTOL = 1e-9
+
+
+# ---------------------------------------------------------------------------
+# Reference implementations (pre stage engine)
+# ---------------------------------------------------------------------------
+
+def legacy_calculate_stage(hist_data: pd.DataFrame):
+    """update_stocks / update_stocks_comprehensive copy."""
+    if hist_data is None or hist_data.empty:
+        return None, None
+
+    if len(hist_data) < 150:
+        return None, None
+
+    ma_30w = hist_data["Close"].rolling(window=150).mean()
+
+    if ma_30w.isna().all():
+        return None, None
+
+    ma_30w = ma_30w.dropna()
+    if len(ma_30w) < 150:
+        return None, None
+
+    current_price = hist_data["Close"].iloc[-1]
+    ma_current = ma_30w.iloc[-1]
+
+    try:
+        ma_slope = (ma_30w.iloc[-1] - ma_30w.iloc[-30]) / ma_30w.iloc[-30]
+    except Exception:
+        ma_slope = 0
+
+    if current_price > ma_current and ma_slope > 0.02:
+        stage = 2
+    elif current_price < ma_current and ma_slope < -0.02:
+        stage = 4
+    elif current_price > ma_current:
+        stage = 3
+    else:
+        stage = 1
+
+    return stage, float(ma_current)
+
+
+def legacy_calculate_stage_update_all(hist):
+    """update_all copy."""
+    try:
+        hist = hist.dropna()
+
+        if len(hist) < 150:
+            return None, None
+
+        hist['MA30W'] = hist['Close'].rolling(window=150).mean()
+        ma_current = hist['MA30W'].iloc[-1]
+
+        current_price = hist['Close'].iloc[-1]
+        prev_ma = hist['MA30W'].iloc[-30]
+
+        slope = (ma_current - prev_ma) / prev_ma if prev_ma else 0
+
+        if current_price > ma_current and slope > 0.02:
+            return 2, float(ma_current)
+        if current_price < ma_current and slope < -0.02:
+            return 4, float(ma_current)
+        if current_price > ma_current:
+            return 3, float(ma_current)
+        return 1, float(ma_current)
+
+    except:
+        return None, None
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def synthetic_close(tickers: int, days: int, seed: int) -> pd.DataFrame:
+    """Random-walk closes with trends, late listings and missing days."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end="2024-12-31", periods=days)
+    drift = rng.normal(0, 0.002, size=(1, tickers))
+    regime = np.repeat(rng.normal(0, 0.003, size=(days // 100 + 1, tickers)), 100, axis=0)[:days]
+    returns = rng.normal(0, 0.015, size=(days, tickers)) + drift + regime
+    close = 50 * np.exp(np.cumsum(returns, axis=0))
+
+    # Listed part-way through (some with too little history for a stage)
+    listed = rng.integers(0, days, size=tickers)
+    listed[: tickers // 2] = 0
+    close[np.arange(days)[:, None] < listed[None, :]] = np.nan
+    # Scattered missing bars
+    close[rng.random((days, tickers)) < 0.002] = np.nan
+    return pd.DataFrame(close, index=dates, columns=[f"T{i:04d}" for i in range(tickers)])
+
+
+def store_close() -> pd.DataFrame:
+    from ohlcv_store import OHLCVStore
+
+    store = OHLCVStore()
+    return store.frame(store.tickers())
+
+
+# ---------------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------------
+
+def compare(close: pd.DataFrame, legacy, min_bars: int, label: str) -> bool:
+    started = time.perf_counter()
+    expected = {}
+    for ticker in close.columns:
+        hist = close[[ticker]].dropna().rename(columns={ticker: "Close"})
+        expected[ticker] = legacy(hist)
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = compute_stages(close, min_bars)
+    engine_s = time.perf_counter() - started
+
+    stage_mismatch = []
+    worst = 0.0
+    for ticker, (stage, ma) in expected.items():
+        row = result.loc[ticker]
+        got = None if pd.isna(row["stage"]) else int(row["stage"])
+        if got != stage:
+            stage_mismatch.append((ticker, stage, got))
+        if ma is not None and got is not None:
+            worst = max(worst, abs(row["ma_30_week"] - ma) / abs(ma))
+
+    staged = sum(1 for s, _ in expected.values() if s is not None)
+    ok = not stage_mismatch and worst <= MA_RTOL
+    print(f"\n{label}: {len(close.columns)} tickers, {staged} with a stage")
+    print(f"  legacy loop {legacy_s * 1000:9.1f} ms")
+    print(f"  engine      {engine_s * 1000:9.1f} ms  ({legacy_s / engine_s:.0f}x)")
+    print(f"  stage mismatches: {len(stage_mismatch)}"
+          + (f", e.g. {stage_mismatch[:3]}" if stage_mismatch else ""))
+    print(f"  max MA relative error: {worst:.2e} ({'ok' if worst <= MA_RTOL else 'FAIL'})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify and benchmark the stage engine")
+    parser.add_argument("--tickers", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--from-store", action="store_true", help="use the local OHLCV store")
+    args = parser.parse_args()
+
+    close = store_close() if args.from_store else synthetic_close(args.tickers, args.days, args.seed)
+    stages = compute_stages(close)["stage"].value_counts().sort_index()
+    print(f"[INFO] Corpus {close.shape[0]} days x {close.shape[1]} tickers; "
+          f"stages {({int(k): int(v) for k, v in stages.items()})}")
+
+    ok = compare(close, legacy_calculate_stage, MIN_BARS_FULL, "update_stocks / comprehensive")
+    ok &= compare(close, legacy_calculate_stage_update_all, MIN_BARS_MA, "update_all")
+    print("\n[OK] Engine matches the per-ticker implementations" if ok
+          else "\n[ERROR] Engine output differs")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+CLI startup benchmark.
+
+Imports each entry-point module in a fresh interpreter with -X importtime
+(module-level code runs, main() does not) and reports wall time, total
+import time and the heaviest top-level imports. --baseline REV also
+imports each module from data_pipeline as it was at git revision REV
+(extracted to a temporary directory), e.g. the commit before the client
+and the stock stack were made lazy, so the savings are measured against
+the real earlier code.
+
+Usage:
+    python bench_startup.py                         # default entry points
+    python bench_startup.py update_all --top 15
+    python bench_startup.py --baseline 5e4c8a8^ --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_MODULES = ["update_all", "update_insiders", "edgar_insider_updater", "prune_insiders",
+                   "build_insider_summary"]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int]]:
+    """(module, cumulative microseconds) for every top-level import."""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Nested imports are indented under their parent
+        if not name.startswith("  "):
+            top.append((name.strip(), int(cumulative)))
+    return top
+
+
+def checkout(rev: str, dest: str) -> str:
+    """Extract data_pipeline at git revision `rev` under `dest`; returns its path."""
+    root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=HERE,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    prefix = os.path.relpath(HERE, root)
+    archive = subprocess.run(["git", "archive", rev, prefix], cwd=root,
+                             capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+    return os.path.join(dest, prefix)
+
+
+def measure(module: str, cwd: str = HERE) -> tuple[float, list[tuple[str, int]], str | None]:
+    """Import `module` in a child interpreter: (wall seconds, top-level imports, error)."""
+    code = f"import {module}"
+
+    env = dict(os.environ)
+    # Module-level env checks should not abort the measurement
+    env.setdefault("SUPABASE_URL", "http://localhost")
+    env.setdefault("SUPABASE_SERVICE_KEY", "bench")
+
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+
+    error = None
+    if proc.returncode != 0:
+        lines = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        error = lines[-1] if lines else f"exit code {proc.returncode}"
+    return wall, parse_importtime(proc.stderr), error
+
+
+def report(module: str, repeat: int, top: int, cwd: str = HERE, label: str | None = None):
+    walls = []
+    imports = []
+    label = label or module
+    for _ in range(repeat):
+        wall, imports, error = measure(module, cwd)
+        if error:
+            print(f"[WARN] {label}: import failed ({error})")
+            return None
+        walls.append(wall)
+
+    total_ms = sum(us for _, us in imports) / 1000
+    wall_ms = statistics.median(walls) * 1000
+    print(f"\n{label}: {wall_ms:.0f} ms wall (median of {repeat}), {total_ms:.0f} ms importing")
+    for name, us in sorted(imports, key=lambda x: -x[1])[:top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    return wall_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup (import) time")
+    parser.add_argument("modules", nargs="*", help=f"modules to import (default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="heaviest top-level imports to list")
+    parser.add_argument("--baseline", metavar="REV",
+                        help="also measure the modules as they were at this git revision")
+    args = parser.parse_args()
+
+    bare = report("os", args.repeat, 0)
+    if bare is not None:
+        print(f"(bare interpreter start: {bare:.0f} ms)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_dir = checkout(args.baseline, tmp) if args.baseline else None
+        for module in args.modules or DEFAULT_MODULES:
+            current = report(module, args.repeat, args.top)
+            if not old_dir:
+                continue
+            if not os.path.exists(os.path.join(old_dir, f"{module}.py")):
+                print(f"  ({module} does not exist at {args.baseline})")
+                continue
+            old = report(module, args.repeat, args.top, old_dir, f"{module} @ {args.baseline}")
+            if current and old:
+                print(f"  {old / current:.1f}x vs {args.baseline} ({old - current:.0f} ms saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-host circuit breakers.
+
+When a host keeps failing (timeouts, 403/429/5xx) its breaker opens and
+callers skip it for a cool-down period instead of paying the full timeout
+on every request. After the cool-down one half-open probe is let through;
+success closes the breaker, failure re-opens it.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES") or 3)
+BREAKER_WINDOW_S = float(os.getenv("BREAKER_WINDOW_S") or 60)
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S") or 120)
+
+
+class CircuitBreaker:
+    """Trips after `failure_threshold` failures within `window` seconds."""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 window: float = BREAKER_WINDOW_S, cooldown: float = BREAKER_COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._failures = []
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, new_state: str, reason: str):
+        print(f"[{datetime.utcnow().isoformat()}] [BREAKER] {self.name}: "
+              f"{self.state} -> {new_state} ({reason})")
+        self.state = new_state
+
+    def allow(self) -> bool:
+        """True if a request to this host should be attempted now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._transition(HALF_OPEN, "cool-down over, probing")
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures.clear()
+            if self.state != CLOSED:
+                self._probe_in_flight = False
+                self._transition(CLOSED, "probe succeeded")
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._opened_at = now
+                self._transition(OPEN, "probe failed")
+                return
+            if self.state == OPEN:
+                return
+
+            self._failures = [t for t in self._failures if now - t < self.window]
+            self._failures.append(now)
+            if len(self._failures) >= self.failure_threshold:
+                self._opened_at = now
+                self._transition(OPEN, f"{len(self._failures)} failures in {self.window:g}s")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    """Shared breaker for a host (created on first use)."""
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def print_breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    for breaker in sorted(breakers, key=lambda b: b.name):
+        print(f"[INFO] Breaker {breaker.name}: {breaker.state}")
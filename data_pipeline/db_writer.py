@@ -0,0 +1,188 @@
+"""
+Write-behind database writer.
+
+Producers put rows on a bounded queue and go straight back to fetching; a
+background thread coalesces them (last row per key wins) and writes them in
+batches when BATCH_SIZE rows are pending or FLUSH_INTERVAL_S seconds have
+passed since the first pending row. A full queue blocks the producer
+(backpressure), and everything still queued is written on close() or at
+interpreter exit.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE") or 500)
+WRITER_FLUSH_INTERVAL_S = float(os.getenv("WRITER_FLUSH_INTERVAL_S") or 2)
+WRITER_MAX_QUEUE = int(os.getenv("WRITER_MAX_QUEUE") or 5000)
+
+_FLUSH = object()
+_STOP = object()
+
+
+def upsert_rows(client, table: str, rows: list[dict], on_conflict: str) -> list[dict]:
+    """Upsert rows in one request; on failure bisect down to the bad rows.
+
+    Returns the rows that could not be written.
+    """
+    try:
+        client.table(table).upsert(rows, on_conflict=on_conflict).execute()
+        return []
+    except Exception as e:
+        if len(rows) == 1:
+            print(f"[WARN] Failed to write {table} row {rows[0].get('ticker', '?')}: {e}")
+            return rows
+    mid = len(rows) // 2
+    return (upsert_rows(client, table, rows[:mid], on_conflict)
+            + upsert_rows(client, table, rows[mid:], on_conflict))
+
+
+
+def upsert_changed(client, table: str, rows: list[dict], on_conflict: str, fingerprints) -> list[dict]:
+    """Upsert only what changed since the last run, per a FingerprintCache.
+
+    Unchanged rows are skipped and changed rows carry only their changed
+    columns. Partial rows are grouped by column set, because one bulk
+    upsert must send the same columns for every row (missing ones would be
+    written as NULL). Returns the rows that could not be written.
+    """
+    groups = {}
+    for row in rows:
+        kind, payload = fingerprints.diff(row)
+        if kind != "skip":
+            groups.setdefault(tuple(sorted(payload)), []).append(payload)
+
+    failed = []
+    for group in groups.values():
+        group_failed = upsert_rows(client, table, group, on_conflict)
+        failed_keys = {id(r) for r in group_failed}
+        for payload in group:
+            if id(payload) not in failed_keys:
+                fingerprints.remember(payload)
+        failed.extend(group_failed)
+    return failed
+
+
+class BatchWriter:
+    """Background batch writer.
+
+    `write(rows)` does the actual write and may return the rows that failed
+    (anything raised counts the whole batch as failed). `key(row)` enables
+    coalescing of repeated rows while they are still pending.
+    """
+
+    def __init__(self, name: str, write, key=None, batch_size: int = WRITER_BATCH_SIZE,
+                 flush_interval: float = WRITER_FLUSH_INTERVAL_S,
+                 max_queue: int = WRITER_MAX_QUEUE):
+        self.name = name
+        self.write = write
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.failed = []
+        self.stats = {"enqueued": 0, "written": 0, "failed": 0, "batches": 0,
+                      "coalesced": 0, "producer_waits": 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"writer-{name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- producer side -------------------------------------------------
+
+    def put(self, row: dict):
+        """Queue one row; blocks while the queue is full."""
+        if self._closed:
+            raise RuntimeError(f"BatchWriter {self.name} is closed")
+        waited = self._queue.full()
+        self._queue.put(row)
+        with self._lock:
+            self.stats["enqueued"] += 1
+            self.stats["producer_waits"] += waited
+
+    def put_many(self, rows):
+        for row in rows:
+            self.put(row)
+
+    def flush(self):
+        """Block until every row queued so far has been written."""
+        if self._closed:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """Write everything still queued and stop the worker (idempotent)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def print_stats(self):
+        s = self.stats
+        print(f"[INFO] Writer {self.name}: {s['written']} rows in {s['batches']} batches, "
+              f"{s['coalesced']} coalesced, {s['failed']} failed, "
+              f"producer blocked {s['producer_waits']} times")
+
+    # --- worker side ---------------------------------------------------
+
+    def _write_batch(self, pending: dict, count: int):
+        rows = list(pending.values())
+        if rows:
+            try:
+                failed = self.write(rows) or []
+            except Exception as e:
+                print(f"[ERROR] Writer {self.name}: batch of {len(rows)} rows failed: {e}")
+                failed = rows
+            self.failed.extend(failed)
+            self.stats["failed"] += len(failed)
+            self.stats["written"] += len(rows) - len(failed)
+            self.stats["batches"] += 1
+        pending.clear()
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _run(self):
+        pending = {}
+        taken = 0          # queue items covered by the pending batch
+        first_at = None
+        while True:
+            timeout = None
+            if first_at is not None:
+                timeout = max(0.0, first_at + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_batch(pending, taken)
+                taken, first_at = 0, None
+                continue
+
+            taken += 1
+            if item is _FLUSH or item is _STOP:
+                self._write_batch(pending, taken)
+                taken, first_at = 0, None
+                if item is _STOP:
+                    return
+                continue
+
+            key = self.key(item) if self.key else len(pending)
+            if key in pending:
+                self.stats["coalesced"] += 1
+            pending[key] = item
+            if first_at is None:
+                first_at = time.monotonic()
+            if len(pending) >= self.batch_size:
+                self._write_batch(pending, taken)
+                taken, first_at = 0, None
@@ -0,0 +1,209 @@
+"""
+Asyncio EDGAR ingestion engine.
+
+Keeps many submissions / Form 4 requests in flight at once. The shared
+SEC token bucket in edgar_fetcher caps the overall request rate, so a run
+is bounded by the SEC rate limit instead of per-request sleeps.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from edgar_fetcher import (
+    SEC_RATE_LIMIT,
+    fetch_edgar_json,
+    list_form4_filings,
+    filings_after_watermark,
+    build_xml_url,
+    fetch_form4_document,
+    parse_form4_xml
+)
+from edgar_store import EdgarStore
+from supabase_client import trade_writer
+from known_trades import KnownTradeIndex
+
+# Max requests in flight at once (the token bucket still caps req/s)
+EDGAR_CONCURRENCY = int(os.getenv("EDGAR_CONCURRENCY") or 16)
+
+
+def fetch_form4_cached(store: EdgarStore, accession: str, url: str, stats: dict) -> str | None:
+    """Return a Form 4 document from the local store, fetching it only once."""
+    text = store.get_document(accession)
+    if text is not None:
+        stats["store_hits"] += 1
+        return text
+
+    text = fetch_form4_document(url)
+    if text:
+        store.put_document(accession, url, text)
+        stats["documents_fetched"] += 1
+    return text
+
+
+async def _process_filing(ticker: str, cik: str, accession: str, primary_doc: str,
+                          filing_date, ctx: dict):
+    """Fetch and parse one Form 4 filing.
+
+    Returns a list of trade dicts, or None if the document could not be fetched.
+    """
+    filing_url = build_xml_url(cik, accession, primary_doc)
+
+    # Counted on the fetch thread, merged here on the event loop
+    fetch_stats = {"store_hits": 0, "documents_fetched": 0}
+    async with ctx["sem"]:
+        xml_text = await asyncio.to_thread(
+            fetch_form4_cached, ctx["store"], accession, filing_url, fetch_stats
+        )
+    for name, value in fetch_stats.items():
+        ctx["stats"][name] += value
+
+    if not xml_text:
+        print(f"[WARN] Could not fetch Form 4 document for {ticker} {accession}")
+        return None
+
+    trades = parse_form4_xml(xml_text, ticker, filing_date)
+    if not trades:
+        print(f"[INFO] No P/S trades parsed for {ticker} {accession}")
+    return trades
+
+
+async def _process_ticker(ticker: str, cik: str, ctx: dict, max_days: int):
+    """Fetch submissions for one company and process its Form 4s.
+
+    In incremental mode only filings newer than the CIK's watermark are
+    processed; the watermark advances once every filing was fetched and
+    its trades were written.
+    """
+    stats = ctx["stats"]
+    store = ctx["store"]
+
+    async with ctx["sem"]:
+        submissions = await asyncio.to_thread(fetch_edgar_json, cik)
+
+    if not submissions:
+        print(f"[WARN] No submissions JSON for {ticker}")
+        stats["skipped_tickers"] += 1
+        return
+
+    watermark = None if ctx["full_rescan"] else store.get_watermark(cik, ticker)
+    since = watermark[1] if watermark else None
+
+    # May fetch older submissions pages, so keep it off the event loop
+    async with ctx["sem"]:
+        filings = await asyncio.to_thread(list_form4_filings, submissions, max_days, since)
+    if not filings:
+        print(f"[INFO] No recent Form 4 filings for {ticker}")
+        stats["skipped_tickers"] += 1
+        return
+
+    newest = max(filings, key=lambda f: f[2])
+
+    if watermark:
+        total = len(filings)
+        filings = filings_after_watermark(filings, watermark)
+        stats["filings_skipped"] += total - len(filings)
+        if not filings:
+            print(f"[INFO] No new Form 4 filings for {ticker} since last run")
+            stats["skipped_tickers"] += 1
+            return
+
+    print(f"[INFO] Found {len(filings)} recent Form 4 filings for {ticker}")
+
+    results = await asyncio.gather(*(
+        _process_filing(ticker, cik, accession, primary_doc, filing_date, ctx)
+        for accession, primary_doc, filing_date in filings
+    ))
+
+    ticker_rows = []
+    for trades in results:
+        if trades is None:
+            continue
+        stats["filings_processed"] += 1
+        ticker_rows.extend(trades)
+
+    # Drop trades already stored, then hand the rest to the background writer
+    # and move on (blocks only if its queue is full)
+    ctx["queued_tickers"].add(ticker)
+    # May run confirm queries against Supabase, so keep it off the event loop
+    ticker_rows = await asyncio.to_thread(ctx["known"].filter_new, ticker_rows)
+    if ticker_rows:
+        await asyncio.to_thread(ctx["writer"].put_many, ticker_rows)
+        print(f"[INFO] Queued {len(ticker_rows)} trades for {ticker} "
+              f"from {sum(1 for t in results if t)} filings")
+
+    # Only advance the watermark when nothing is left to retry (applied once written)
+    if all(trades is not None for trades in results):
+        ctx["watermarks"].append((cik, ticker, newest[0], newest[2]))
+
+
+async def run_edgar_update(ticker_ciks: dict, max_days: int = 120,
+                           concurrency: int = EDGAR_CONCURRENCY,
+                           store: EdgarStore | None = None,
+                           full_rescan: bool = False,
+                           inserted: list | None = None) -> dict:
+    """Process every ticker -> CIK pair concurrently.
+
+    Form 4 documents already in the local store are not fetched again.
+    Unless full_rescan is set, only filings newer than each CIK's watermark
+    are processed. Trades go through a write-behind writer, so fetching never
+    waits on Supabase; newly inserted rows are appended to `inserted`.
+    Returns run stats including the achieved SEC request rate.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+
+    stats = {
+        "processed_tickers": 0,
+        "skipped_tickers": 0,
+        "total_trades": 0,
+        "store_hits": 0,
+        "documents_fetched": 0,
+        "filings_processed": 0,
+        "filings_skipped": 0,
+    }
+    inserted = inserted if inserted is not None else []
+    known = await asyncio.to_thread(KnownTradeIndex)
+    writer = trade_writer(inserted=inserted)
+    ctx = {
+        "sem": asyncio.Semaphore(concurrency),
+        "store": store or EdgarStore(),
+        "stats": stats,
+        "full_rescan": full_rescan,
+        "writer": writer,
+        "known": known,
+        "queued_tickers": set(),
+        "watermarks": [],
+    }
+
+    started = time.monotonic()
+    granted_before = SEC_RATE_LIMIT.granted
+
+    try:
+        await asyncio.gather(*(
+            _process_ticker(ticker, cik, ctx, max_days)
+            for ticker, cik in ticker_ciks.items()
+        ))
+    finally:
+        await asyncio.to_thread(writer.close)
+    known.print_stats()
+    writer.print_stats()
+
+    # Watermarks move only for tickers whose rows were all written
+    failed_tickers = {row.get("ticker") for row in writer.failed}
+    for cik, ticker, accession, filing_date in ctx["watermarks"]:
+        if ticker not in failed_tickers:
+            ctx["store"].set_watermark(cik, ticker, accession, filing_date)
+
+    written_tickers = {row["ticker"] for row in inserted}
+    stats["processed_tickers"] = len(written_tickers)
+    stats["skipped_tickers"] += len(ctx["queued_tickers"] - written_tickers)
+    stats["total_trades"] = len(inserted)
+    stats["known_trades_filtered"] = known.stats["filtered"]
+
+    elapsed = time.monotonic() - started
+    stats["sec_requests"] = SEC_RATE_LIMIT.granted - granted_before
+    stats["elapsed_s"] = elapsed
+    stats["requests_per_s"] = stats["sec_requests"] / elapsed if elapsed > 0 else 0.0
+    return stats
@@ -0,0 +1,285 @@
+"""
+EDGAR Insider Backfill
+
+Backfills years of insider history from the SEC quarterly full-index files
+(master.idx / form.idx) instead of one submissions call per company.
+Form 4 rows for CIKs in ticker_cik.TICKER_CIK are fetched through the local
+document store and parsed in a process pool.
+
+Progress is recorded per quarter, so an interrupted backfill resumes at the
+first unfinished quarter.
+
+Usage:
+    python edgar_backfill.py --start 2021Q1 --end 2023Q4
+    python edgar_backfill.py --start 2023Q1 --end 2023Q1 --index-dir ./sec_mirror
+
+With --index-dir the run is fully offline: index files are read from
+<dir>/<year>/QTR<n>/master.idx (or form.idx) and documents from the local
+store or from <dir>/<Filename> as listed in the index.
+"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import http_transport
+from ticker_cik import TICKER_CIK
+from edgar_fetcher import SEC_RATE_LIMIT, form4_issuer, parse_form4_xml
+from edgar_async import EDGAR_CONCURRENCY, fetch_form4_cached
+from edgar_store import EdgarStore
+from supabase_client import save_trades
+from incremental_summary import apply_new_trades
+
+FULL_INDEX_URL = "https://www.sec.gov/Archives/edgar/full-index/{year}/QTR{quarter}/{name}"
+ARCHIVES_URL = "https://www.sec.gov/Archives/{filename}"
+
+INDEX_NAMES = ("master.idx", "form.idx")
+
+# form.idx rows are fixed-width: Form Type, Company Name, CIK, Date Filed, File Name
+FORM_IDX_ROW = re.compile(
+    r"^(?P<form>\S+(?: \S+)*?)\s{2,}(?P<company>.+?)\s{2,}(?P<cik>\d+)\s+"
+    r"(?P<date>\d{4}-?\d{2}-?\d{2})\s+(?P<filename>\S+)\s*$"
+)
+
+
+def parse_quarter(text: str) -> tuple[int, int]:
+    """Parse '2023Q4' into (2023, 4)."""
+    m = re.fullmatch(r"(\d{4})Q([1-4])", text.strip().upper())
+    if not m:
+        raise argparse.ArgumentTypeError(f"expected YYYYQn, got {text!r}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def iter_quarters(start: tuple[int, int], end: tuple[int, int]):
+    year, quarter = start
+    while (year, quarter) <= end:
+        yield year, quarter
+        quarter += 1
+        if quarter > 4:
+            year, quarter = year + 1, 1
+
+
+def _parse_date(text: str):
+    return datetime.strptime(text.replace("-", ""), "%Y%m%d").date()
+
+
+def parse_index_line(line: str, name: str):
+    """Parse one index row into (form, cik, date_filed, filename), or None."""
+    if name == "master.idx":
+        parts = line.split("|")
+        if len(parts) != 5 or not parts[0].strip().isdigit():
+            return None
+        cik, _, form, date_filed, filename = (p.strip() for p in parts)
+    else:
+        m = FORM_IDX_ROW.match(line)
+        if not m:
+            return None
+        form, cik, date_filed, filename = m.group("form", "cik", "date", "filename")
+
+    try:
+        return form, int(cik), _parse_date(date_filed), filename
+    except ValueError:
+        return None
+
+
+def _index_lines(year: int, quarter: int, index_dir: str | None):
+    """Stream the lines of a quarter's index file (local or from SEC)."""
+    if index_dir:
+        for name in INDEX_NAMES:
+            path = os.path.join(index_dir, str(year), f"QTR{quarter}", name)
+            if os.path.exists(path):
+                with open(path, encoding="latin-1") as f:
+                    for line in f:
+                        yield name, line.rstrip("\n")
+                return
+        raise FileNotFoundError(f"No index file for {year}Q{quarter} under {index_dir}")
+
+    name = INDEX_NAMES[0]
+    SEC_RATE_LIMIT.acquire()
+    with http_transport.get(FULL_INDEX_URL.format(year=year, quarter=quarter, name=name),
+                            timeout=60, stream=True) as r:
+        r.raise_for_status()
+        for raw in r.iter_lines():
+            yield name, raw.decode("latin-1")
+
+
+def list_quarter_filings(year: int, quarter: int, cik_tickers: dict, index_dir: str | None = None):
+    """Return Form 4 filings touching tracked CIKs as (accession, filename, date, ciks).
+
+    The index lists a filing once for the issuer and once per reporting
+    owner, and a tracked company can be either (BRK.B reports its stakes in
+    other companies). Rows are merged per accession with every tracked CIK
+    they were listed under, {cik: tickers}; which one is the issuer is only
+    known from the document itself (see _parse_job).
+    """
+    filings = {}
+    for name, line in _index_lines(year, quarter, index_dir):
+        row = parse_index_line(line, name)
+        if not row:
+            continue
+        form, cik, date_filed, filename = row
+        if form != "4" or cik not in cik_tickers:
+            continue
+        accession = os.path.splitext(os.path.basename(filename))[0]
+        entry = filings.setdefault(accession, (accession, filename, date_filed, {}))
+        entry[3][cik] = cik_tickers[cik]
+    return list(filings.values())
+
+
+def _load_document(store: EdgarStore, accession: str, filename: str,
+                   index_dir: str | None) -> tuple[str | None, dict]:
+    """Document text from the store, a local mirror, or (online only) SEC.
+
+    Runs on the fetch pool, so it counts into its own stats dict; the caller
+    sums them after the map.
+    """
+    stats = {"store_hits": 0, "documents_fetched": 0, "missing": 0}
+    if index_dir:
+        text = store.get_document(accession)
+        if text is not None:
+            stats["store_hits"] += 1
+            return text, stats
+
+        path = os.path.join(index_dir, filename)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            store.put_document(accession, path, text)
+            stats["documents_fetched"] += 1
+            return text, stats
+
+        stats["missing"] += 1
+        return None, stats
+
+    text = fetch_form4_cached(store, accession, ARCHIVES_URL.format(filename=filename), stats)
+    return text, stats
+
+
+def _issuer_tickers(text: str, ciks: dict) -> list[str] | None:
+    """Tickers of the filing's issuer among the tracked CIKs it was listed under.
+
+    None when the issuer is not one of them (a tracked company listed only
+    as a reporting owner).
+    """
+    issuer_cik, symbol = form4_issuer(text)
+    if issuer_cik is not None:
+        return ciks.get(issuer_cik)
+    # No issuerCik: fall back to the trading symbol
+    for tickers in ciks.values():
+        if symbol and any(t.upper().replace("-", ".") == symbol.replace("-", ".") for t in tickers):
+            return tickers
+    return None
+
+
+def _parse_job(job):
+    """Trades of one filing for its issuer's tickers, or None if the issuer is not tracked."""
+    text, ciks, filing_date = job
+    tickers = _issuer_tickers(text, ciks)
+    if tickers is None:
+        return None
+    trades = []
+    for ticker in tickers:
+        trades.extend(parse_form4_xml(text, ticker, filing_date))
+    return trades
+
+
+def backfill_quarter(year: int, quarter: int, store: EdgarStore, cik_tickers: dict,
+                     index_dir: str | None, parse_pool: ProcessPoolExecutor,
+                     inserted: list) -> tuple[int, int]:
+    """Backfill one quarter. Returns (filings, trades)."""
+    filings = list_quarter_filings(year, quarter, cik_tickers, index_dir)
+    print(f"[INFO] {year}Q{quarter}: {len(filings)} Form 4 filings listed under tracked CIKs")
+
+    with ThreadPoolExecutor(max_workers=EDGAR_CONCURRENCY) as fetch_pool:
+        loaded = list(fetch_pool.map(
+            lambda f: _load_document(store, f[0], f[1], index_dir), filings
+        ))
+
+    stats = {"store_hits": 0, "documents_fetched": 0, "missing": 0, "other_issuer": 0}
+    texts = []
+    for text, counts in loaded:
+        texts.append(text)
+        for name, value in counts.items():
+            stats[name] += value
+
+    jobs = [(text, ciks, filing_date)
+            for text, (_, _, filing_date, ciks) in zip(texts, filings) if text]
+
+    trades = []
+    for parsed in parse_pool.map(_parse_job, jobs, chunksize=32):
+        if parsed is None:
+            stats["other_issuer"] += 1
+        else:
+            trades.extend(parsed)
+
+    failed = []
+    saved = save_trades(trades, inserted=inserted, failed=failed) if trades else 0
+
+    print(f"[INFO] {year}Q{quarter}: {stats['documents_fetched']} fetched, "
+          f"{stats['store_hits']} from store, {stats['missing']} missing, "
+          f"{stats['other_issuer']} filed as owner of an untracked issuer, "
+          f"{saved}/{len(trades)} trades saved")
+
+    if stats["missing"] or len(jobs) < len(filings):
+        raise RuntimeError(f"{len(filings) - len(jobs)} documents unavailable for {year}Q{quarter}")
+    if failed:
+        # Not marked done, so the next run saves them again (duplicates are skipped)
+        raise RuntimeError(f"{len(failed)} trades could not be saved for {year}Q{quarter}")
+
+    return len(filings), len(trades)
+
+
+def run_backfill(start: tuple[int, int], end: tuple[int, int], index_dir: str | None = None,
+                 force: bool = False, workers: int | None = None):
+    """Backfill every quarter in [start, end], skipping quarters already done."""
+    print(f"[INFO] Starting EDGAR backfill {start[0]}Q{start[1]}..{end[0]}Q{end[1]} "
+          f"({'offline' if index_dir else 'online'}) at {datetime.utcnow().isoformat()}")
+
+    # Share classes (GOOG/GOOGL) share a CIK, so a CIK can map to several tickers
+    cik_tickers = {}
+    for ticker, cik in TICKER_CIK.items():
+        cik_tickers.setdefault(int(cik), []).append(ticker)
+
+    store = EdgarStore()
+    total_filings = 0
+    total_trades = 0
+    inserted = []
+
+    with ProcessPoolExecutor(max_workers=workers) as parse_pool:
+        for year, quarter in iter_quarters(start, end):
+            if not force and store.is_quarter_done(year, quarter):
+                print(f"[INFO] {year}Q{quarter}: already done, skipping")
+                continue
+            try:
+                filings, trades = backfill_quarter(year, quarter, store, cik_tickers,
+                                                   index_dir, parse_pool, inserted)
+            except Exception as e:
+                print(f"[ERROR] {year}Q{quarter}: {e} (will be retried next run)")
+                continue
+            store.mark_quarter_done(year, quarter, filings, trades)
+            total_filings += filings
+            total_trades += trades
+
+    print(f"\n{'='*50}")
+    print(f"[INFO] Filings: {total_filings}")
+    print(f"[INFO] Trades saved: {total_trades}")
+
+    if inserted:
+        print(f"\n[INFO] Updating insider summaries...")
+        apply_new_trades(inserted, days=90)
+
+    print(f"\n[OK] EDGAR backfill complete")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill insider trades from SEC quarterly indexes")
+    parser.add_argument("--start", type=parse_quarter, required=True, help="first quarter, e.g. 2021Q1")
+    parser.add_argument("--end", type=parse_quarter, required=True, help="last quarter, e.g. 2023Q4")
+    parser.add_argument("--index-dir", help="read index files and documents from a local mirror (offline)")
+    parser.add_argument("--force", action="store_true", help="redo quarters already marked done")
+    parser.add_argument("--workers", type=int, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    run_backfill(args.start, args.end, index_dir=args.index_dir, force=args.force, workers=args.workers)
@@ -1,78 +1,221 @@
 """
 HYBRID EDGAR FETCHER — bulletproof
-Handles direct SEC requests with User-Agent and proxy fallback.
+Handles direct SEC requests with User-Agent and proxy fallback,
+with a per-host circuit breaker choosing the healthy path.
 """
 
-import requests
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 from xml.etree import ElementTree as ET
 import os
+import re
 from dotenv import load_dotenv
+import http_transport
+from circuit_breaker import breaker_for
+from rate_limiter import TokenBucket
+from local_cache import ConditionalCache
 
 load_dotenv()
 
-DIRECT = "https://data.sec.gov/submissions/CIK{}.json"
-PROXY = "https://api.allorigins.win/raw?url=https://data.sec.gov/submissions/CIK{}.json"
+SUBMISSIONS_BASE = "https://data.sec.gov/submissions"
+PROXY_BASE = "https://api.allorigins.win/raw?url="
+PROXY_HOST = urlsplit(PROXY_BASE).hostname
 
-EDGAR_USER_AGENT = os.getenv("EDGAR_USER_AGENT") or "SilentWhale/1.0 (contact: your-robin@digiget.uk)"
+# SEC fair-access policy allows ~10 requests/second across all of our workers
+EDGAR_MAX_RPS = float(os.getenv("EDGAR_MAX_RPS") or 8)
 
-HEADERS = {
-    "User-Agent": EDGAR_USER_AGENT
-}
+# Global token bucket - every direct request to SEC hosts takes a token
+SEC_RATE_LIMIT = TokenBucket(EDGAR_MAX_RPS)
 
+# Submissions JSON cache, revalidated with If-None-Match / If-Modified-Since
+SUBMISSIONS_CACHE = ConditionalCache("edgar_submissions")
+
+# Submission columns that list_form4_filings needs
+SUBMISSION_COLUMNS = ("form", "accessionNumber", "primaryDocument", "filingDate")
+
+
+def _form4_columns(columns: dict) -> dict:
+    """Keep only the Form 4 rows of a columnar filings block."""
+    columns = {c: columns.get(c, []) for c in SUBMISSION_COLUMNS}
+    keep = [i for i, f in enumerate(columns["form"]) if f == "4"]
+    return {c: [values[i] for i in keep if i < len(values)]
+            for c, values in columns.items()}
+
+
+def _trim_submissions(sub: dict) -> dict:
+    """Reduce a submissions document to its Form 4 rows.
+
+    Large filers have multi-megabyte submissions JSON; only the Form 4 columns
+    are cached, so a 304 costs a small file read instead of a full decode.
+    """
+    filings = sub.get("filings", {})
+
+    return {
+        "cik": sub.get("cik"),
+        "name": sub.get("name"),
+        "filings": {
+            "recent": _form4_columns(filings.get("recent", {})),
+            "files": filings.get("files", []),
+        },
+    }
+
+
+def _is_host_failure(status_code: int) -> bool:
+    """Statuses that mean the host is blocking or unhealthy (not just a missing document)."""
+    return status_code in (403, 429) or status_code >= 500
+
+
+def _hybrid_get(url: str, label: str, headers: dict | None = None, timeout: float = 10):
+    """GET an SEC URL directly, falling back to the allorigins proxy.
+
+    Each host has a circuit breaker: while the direct host's breaker is open,
+    requests go straight to the proxy instead of waiting out the timeout
+    (and vice versa). Returns (response, "direct"|"proxy") for a 200/304,
+    or (None, None) when both paths failed.
+    """
+    direct = breaker_for(urlsplit(url).hostname)
+    if direct.allow():
+        try:
+            SEC_RATE_LIMIT.acquire()
+            r = http_transport.get(url, headers=headers, timeout=timeout)
+            if _is_host_failure(r.status_code):
+                direct.record_failure()
+            else:
+                direct.record_success()
+            if r.status_code in (200, 304):
+                return r, "direct"
+        except Exception as e:
+            direct.record_failure()
+            print(f"[WARN] Direct {label} fetch failed: {e}")
 
-def fetch_edgar_json(cik: str):
-    """Fetch company submissions JSON from SEC EDGAR with hybrid direct/proxy approach."""
-    url_direct = DIRECT.format(cik.zfill(10))
-    
-    # Try direct request first
-    try:
-        r = requests.get(url_direct, headers=HEADERS, timeout=8)
-        if r.status_code == 200:
-            return r.json()
-    except Exception as e:
-        print(f"[WARN] Direct EDGAR fetch failed for CIK {cik}: {e}")
-    
     # Fall back to proxy
-    url_proxy = PROXY.format(cik.zfill(10))
+    proxy = breaker_for(PROXY_HOST)
+    if proxy.allow():
+        try:
+            r = http_transport.get(f"{PROXY_BASE}{url}", timeout=timeout)
+            if _is_host_failure(r.status_code):
+                proxy.record_failure()
+            else:
+                proxy.record_success()
+            if r.status_code == 200:
+                return r, "proxy"
+        except Exception as e:
+            proxy.record_failure()
+            print(f"[WARN] Proxy {label} fetch failed: {e}")
+
+    return None, None
+
+
+def _fetch_submissions_doc(name: str, trim):
+    """Fetch data.sec.gov/submissions/<name>.json, conditional on the cache, with proxy fallback."""
+    url = f"{SUBMISSIONS_BASE}/{name}.json"
+    label = f"EDGAR {name}"
+
+    r, via = _hybrid_get(url, label, headers=SUBMISSIONS_CACHE.validators(name), timeout=8)
+    if r is not None and r.status_code == 304:
+        cached = SUBMISSIONS_CACHE.load(name)
+        if cached is not None:
+            return cached
+        # Cache entry unreadable: fetch unconditionally
+        r, via = _hybrid_get(url, label, timeout=8)
+
+    if r is None:
+        return None
+
     try:
-        r = requests.get(url_proxy, timeout=8)
-        if r.status_code == 200:
-            return r.json()
+        doc = trim(r.json())
     except Exception as e:
-        print(f"[WARN] Proxy EDGAR fetch failed for CIK {cik}: {e}")
-    
-    return None
+        print(f"[WARN] Bad JSON for {label}: {e}")
+        return None
 
+    if via == "direct":
+        SUBMISSIONS_CACHE.store(name, doc, r)  # Proxy responses carry no usable validators
+    return doc
 
-def list_form4_filings(sub: dict, max_days: int = 120):
-    """Extract recent Form 4 filings from submissions JSON.
-    
-    Returns list of (accessionNumber, primaryDocument, filingDate) tuples.
+
+def fetch_edgar_json(cik: str):
+    """Fetch company submissions JSON from SEC EDGAR with hybrid direct/proxy approach.
+
+    Returns the submissions document trimmed to its Form 4 rows. Direct
+    requests are conditional; a 304 is served from SUBMISSIONS_CACHE.
     """
-    if not sub:
-        return []
-    
-    recent = sub.get("filings", {}).get("recent", {})
-    forms = recent.get("form", [])
-    acc = recent.get("accessionNumber", [])
-    docs = recent.get("primaryDocument", [])
-    dates = recent.get("filingDate", [])
-    
-    cutoff = datetime.utcnow().date() - timedelta(days=max_days)
-    
-    out = []
-    for f, a, d, p in zip(forms, acc, dates, docs):
+    return _fetch_submissions_doc(f"CIK{cik.zfill(10)}", _trim_submissions)
+
+
+def fetch_submissions_page(name: str):
+    """Fetch one older paged submissions file (filings.files[].name), trimmed to Form 4 rows."""
+    return _fetch_submissions_doc(name.removesuffix(".json"), _form4_columns)
+
+
+def _iter_form4_rows(columns: dict, cutoff):
+    for f, a, d, p in zip(columns.get("form", []), columns.get("accessionNumber", []),
+                          columns.get("filingDate", []), columns.get("primaryDocument", [])):
         if f != "4":
             continue
         try:
             dt = datetime.strptime(d, "%Y-%m-%d").date()
             if dt >= cutoff:
-                out.append((a, p, dt))
+                yield (a, p, dt)
         except Exception:
             continue
+
+
+def iter_form4_filings(sub: dict, max_days: int = 120, since=None, fetch_page=None):
+    """Lazily yield Form 4 filings from filings.recent, then from older pages.
+
+    An older page (filings.files) is only fetched when its date range
+    reaches back past the cutoff, so deep windows cost extra requests only
+    for very active filers. `since` raises the cutoff (e.g. to a watermark
+    date) so incremental runs never page.
+
+    Yields (accessionNumber, primaryDocument, filingDate) tuples.
+    """
+    if not sub:
+        return
+
+    cutoff = datetime.utcnow().date() - timedelta(days=max_days)
+    if since and since > cutoff:
+        cutoff = since
+
+    filings = sub.get("filings", {})
+    yield from _iter_form4_rows(filings.get("recent", {}), cutoff)
+
+    fetch_page = fetch_page or fetch_submissions_page
+    pages = sorted(filings.get("files", []), key=lambda f: f.get("filingTo", ""), reverse=True)
+    for page in pages:
+        if page.get("filingTo", "") < cutoff.isoformat():
+            break  # This page and every older one end before the cutoff
+        columns = fetch_page(page["name"])
+        if columns is None:
+            print(f"[WARN] Could not fetch submissions page {page['name']}")
+            continue
+        yield from _iter_form4_rows(columns, cutoff)
+
+
+def list_form4_filings(sub: dict, max_days: int = 120, since=None):
+    """Extract recent Form 4 filings from submissions JSON.
     
-    return out
+    Includes older paged submissions files when the window reaches them.
+    Returns list of (accessionNumber, primaryDocument, filingDate) tuples.
+    """
+    return list(iter_form4_filings(sub, max_days=max_days, since=since))
+
+
+def filings_after_watermark(filings: list, watermark) -> list:
+    """Drop filings at or before a (accession, filing_date) watermark.
+
+    Accession numbers are not ordered across filer agents, so filings are
+    compared by date; other filings from the watermark day are kept (saving
+    them again is a no-op upsert).
+    """
+    if not watermark:
+        return filings
+
+    mark_accession, mark_date = watermark
+    return [
+        (a, p, dt) for a, p, dt in filings
+        if dt > mark_date or (dt == mark_date and a != mark_accession)
+    ]
 
 
 def build_xml_url(cik: str, acc: str, doc: str) -> str:
@@ -84,24 +227,17 @@ def build_xml_url(cik: str, acc: str, doc: str) -> str:
 
 def fetch_form4_document(url: str) -> str | None:
     """Fetch Form 4 XML/HTML document with hybrid direct/proxy approach."""
-    # Try direct request first
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=10)
-        if r.status_code == 200:
-            return r.text
-    except Exception as e:
-        print(f"[WARN] Direct document fetch failed: {e}")
-    
-    # Fall back to proxy
-    proxy_url = f"https://api.allorigins.win/raw?url={url}"
-    try:
-        r = requests.get(proxy_url, timeout=10)
-        if r.status_code == 200:
-            return r.text
-    except Exception as e:
-        print(f"[WARN] Proxy document fetch failed: {e}")
-    
-    return None
+    r, _ = _hybrid_get(url, "document", timeout=10)
+    return r.text if r is not None and r.status_code == 200 else None
+
+
+# Form 4 transaction element tags (namespace stripped)
+_TX_TAGS = ("nonDerivativeTransaction", "derivativeTransaction")
+
+# <issuer> fields, read without parsing the whole document
+_ISSUER_CIK = re.compile(r"<(?:\w+:)?issuerCik>\s*(\d+)\s*<")
+_ISSUER_SYMBOL = re.compile(r"<(?:\w+:)?issuerTradingSymbol>\s*([^<\s]+)\s*<")
+_SHARE_TAGS = ("transactionShares", "shares")
 
 
 def _find_text(node, suffix: str):
@@ -112,11 +248,111 @@ def _find_text(node, suffix: str):
     return None
 
 
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _value_text(node):
+    """Stripped text of the <value> element of a Form 4 field."""
+    for v in node:
+        if _local(v.tag) == "value":
+            return (v.text or "").strip() or None
+    return None
+
+
+def _transaction_fields(tx) -> tuple:
+    """(code, shares, date) texts of one transaction in one pass over its children.
+
+    Form 4 puts transactionDate/value, transactionCoding/transactionCode
+    and transactionAmounts/transactionShares/value at fixed depths, so no
+    subtree is searched per field.
+    """
+    code = shares = tx_date = None
+    for child in tx:
+        name = _local(child.tag)
+        if name == "transactionCoding":
+            for e in child:
+                if _local(e.tag) == "transactionCode" and e.text:
+                    code = e.text.strip()
+                    break
+        elif name == "transactionDate":
+            tx_date = _value_text(child)
+        elif name == "transactionAmounts":
+            for e in child:
+                if _local(e.tag) in _SHARE_TAGS:
+                    shares = _value_text(e)
+                    if shares:
+                        break
+    return code, shares, tx_date
+
+
+def _parse_transaction(tx, ticker: str, insider_name: str, filing_date) -> dict | None:
+    """Build a trade dict from one transaction element, or None to skip it."""
+    code, shares_txt, date_txt = _transaction_fields(tx)
+
+    # Transaction code P / S / M
+    if not code:
+        return None
+    code = code.upper()
+    if code not in ("P", "S", "M"):  # P=Purchase, S=Sale, M=Option exercise
+        return None
+
+    # Shares from transactionShares/value
+    if not shares_txt:
+        return None
+    try:
+        shares = int(float(shares_txt.replace(",", "")))
+    except Exception:
+        return None
+
+    # Transaction date (or fall back to filing_date)
+    tx_date = filing_date
+    if date_txt:
+        try:
+            tx_date = datetime.strptime(date_txt, "%Y-%m-%d").date()
+        except Exception:
+            pass
+
+    # Map code to buy/sell
+    tx_type = "buy" if code in ("P", "M") else "sell"
+
+    return {
+        "ticker": ticker,
+        "insider_name": insider_name,
+        "transaction_type": tx_type,
+        "shares": shares,
+        "transaction_date": tx_date.isoformat(),
+        "filing_date": filing_date.isoformat(),
+    }
+
+
+def form4_issuer(text: str) -> tuple[int | None, str | None]:
+    """(issuerCik, issuerTradingSymbol) of a Form 4 document; None where absent."""
+    cik = _ISSUER_CIK.search(text)
+    symbol = _ISSUER_SYMBOL.search(text)
+    return (int(cik.group(1)) if cik else None,
+            symbol.group(1).upper() if symbol else None)
+
+
+def extract_ownership_xml(text: str) -> str:
+    """Return the <XML> block of a full submission .txt, or the text unchanged."""
+    start = text.find("<XML>")
+    if start == -1:
+        return text
+    end = text.find("</XML>", start)
+    return text[start + len("<XML>"):end if end != -1 else None].strip()
+
+
 def parse_form4_xml(xml_text: str, ticker: str, filing_date):
     """Parse Form 4 XML and extract insider transactions.
     
     Handles both non-derivative and derivative transactions.
-    Includes option exercises (code M) as buys.
+    Includes option exercises (code M) as buys. Accepts either the XML
+    document itself or a full submission .txt wrapping it.
+
+    Only the paths Form 4 defines are visited: the tables under the root,
+    their transactions, and each transaction's fields in one pass over its
+    children (see _transaction_fields).
     
     Returns list of trade dictionaries with:
     - ticker
@@ -129,85 +365,29 @@ def parse_form4_xml(xml_text: str, ticker: str, filing_date):
     trades = []
     
     try:
-        root = ET.fromstring(xml_text)
+        root = ET.fromstring(extract_ownership_xml(xml_text))
     except Exception as e:
         print(f"[WARN] XML parse error: {e}")
         return trades
     
     insider_name = _find_text(root, "rptOwnerName") or "Unknown Insider"
-    
-    # Look in nonDerivativeTable and derivativeTable for transactions
-    for table_suffix in ("nonDerivativeTable", "derivativeTable"):
-        for table in root.iter():
-            if not table.tag.endswith(table_suffix):
-                continue
-            
-            for tx in table:
-                tag = tx.tag.split("}")[-1]
-                if tag not in ("nonDerivativeTransaction", "derivativeTransaction"):
-                    continue
-                
-                # Extract transaction code P / S / M
-                code = _find_text(tx, "transactionCode")
-                if not code:
-                    continue
-                code = code.strip().upper()
-                if code not in ("P", "S", "M"):  # P=Purchase, S=Sale, M=Option exercise
-                    continue
-                
-                # Extract shares from transactionShares/value
-                shares_txt = None
-                for e in tx.iter():
-                    t = e.tag.split("}")[-1]
-                    if t in ("transactionShares", "shares"):
-                        for v in e.iter():
-                            if v.tag.endswith("value") and v.text:
-                                shares_txt = v.text.strip()
-                                break
-                    if shares_txt:
-                        break
-                
-                if not shares_txt:
-                    continue
-                
-                try:
-                    shares = int(float(shares_txt.replace(",", "")))
-                except Exception:
-                    continue
-                
-                # Extract transaction date (or fall back to filing_date)
-                date_txt = None
-                for e in tx.iter():
-                    if e.tag.endswith("transactionDate"):
-                        for v in e.iter():
-                            if v.tag.endswith("value") and v.text:
-                                date_txt = v.text.strip()
-                                break
-                    if date_txt:
-                        break
-                
-                if date_txt:
-                    try:
-                        tx_date = datetime.strptime(date_txt, "%Y-%m-%d").date()
-                    except Exception:
-                        tx_date = filing_date
-                else:
-                    tx_date = filing_date
-                
-                # Map code to buy/sell
-                if code in ("P", "M"):
-                    tx_type = "buy"
-                else:
-                    tx_type = "sell"
-                
-                trades.append({
-                    "ticker": ticker,
-                    "insider_name": insider_name,
-                    "transaction_type": tx_type,
-                    "shares": shares,
-                    "transaction_date": tx_date.isoformat(),
-                    "filing_date": filing_date.isoformat(),
-                })
-    
-    return trades
 
+    # Non-derivative trades are still emitted before derivative ones
+    non_derivative = []
+    derivative = []
+    for table in root:
+        tag = table.tag
+        if tag.endswith("nonDerivativeTable"):
+            out = non_derivative
+        elif tag.endswith("derivativeTable"):
+            out = derivative
+        else:
+            continue
+        out.extend(tx for tx in table if _local(tx.tag) in _TX_TAGS)
+
+    for tx in non_derivative + derivative:
+        trade = _parse_transaction(tx, ticker, insider_name, filing_date)
+        if trade:
+            trades.append(trade)
+
+    return trades
@@ -2,105 +2,79 @@
 EDGAR Insider Transaction Updater
 Fetches insider transactions from SEC EDGAR Form 4 filings and updates Supabase.
 Run daily via cron/Task Scheduler.
+
+By default only filings newer than each CIK's watermark are processed.
+Pass --full to rescan the whole 120-day window.
 """
 
-import time
+import argparse
+import asyncio
 from datetime import datetime
 from ticker_cik import TICKER_CIK, TRACKED_TICKERS
-from edgar_fetcher import (
-    fetch_edgar_json,
-    list_form4_filings,
-    build_xml_url,
-    fetch_form4_document,
-    parse_form4_xml
-)
-from supabase_client import save_trades, update_summary, rebuild_all_summaries
+from edgar_fetcher import EDGAR_MAX_RPS, SUBMISSIONS_CACHE
+from edgar_async import run_edgar_update, EDGAR_CONCURRENCY
+from http_transport import print_transport_stats
+from circuit_breaker import print_breaker_states
+from incremental_summary import apply_new_trades
 
 
-def update_insiders_from_edgar():
+def update_insiders_from_edgar(full_rescan: bool = False, verify_summary: bool | None = None):
     """Main pipeline: fetch Form 4 filings and update Supabase."""
-    print(f"[INFO] Starting EDGAR insider update at {datetime.utcnow().isoformat()}")
-    print(f"[INFO] Tracking {len(TRACKED_TICKERS)} tickers\n")
-    
-    total_trades = 0
-    processed_tickers = 0
+    mode = "full rescan" if full_rescan else "incremental"
+    print(f"[INFO] Starting EDGAR insider update ({mode}) at {datetime.utcnow().isoformat()}")
+    print(f"[INFO] Tracking {len(TRACKED_TICKERS)} tickers")
+    print(f"[INFO] Rate limit {EDGAR_MAX_RPS:g} req/s, {EDGAR_CONCURRENCY} requests in flight\n")
+
+    ticker_ciks = {}
     skipped_tickers = 0
-    
+
     for ticker in TRACKED_TICKERS:
         cik = TICKER_CIK.get(ticker)
         if not cik:
             print(f"[WARN] No CIK for {ticker}, skipping.")
             skipped_tickers += 1
             continue
-        
-        print(f"[INFO] Processing {ticker} (CIK {cik})")
-        
-        # Fetch company submissions
-        submissions = fetch_edgar_json(cik)
-        if not submissions:
-            print(f"[WARN] No submissions JSON for {ticker}")
-            skipped_tickers += 1
-            time.sleep(0.5)  # Be polite to SEC
-            continue
-        
-        # Get recent Form 4 filings
-        filings = list_form4_filings(submissions, max_days=120)
-        if not filings:
-            print(f"[INFO] No recent Form 4 filings for {ticker}")
-            skipped_tickers += 1
-            time.sleep(0.5)
-            continue
-        
-        print(f"[INFO] Found {len(filings)} recent Form 4 filings for {ticker}")
-        
-        ticker_trades = 0
-        
-        # Process each Form 4 filing
-        for accession, primary_doc, filing_date in filings:
-            filing_url = build_xml_url(cik, accession, primary_doc)
-            print(f"[INFO] Fetching Form 4: {accession}")
-            
-            xml_text = fetch_form4_document(filing_url)
-            if not xml_text:
-                print(f"[WARN] Could not fetch Form 4 document for {ticker} {accession}")
-                continue
-            
-            # Parse transactions from XML
-            trades = parse_form4_xml(xml_text, ticker, filing_date)
-            if not trades:
-                print(f"[INFO] No P/S trades parsed for {ticker} {accession}")
-                continue
-            
-            # Save to Supabase
-            save_trades(trades)
-            ticker_trades += len(trades)
-            total_trades += len(trades)
-            print(f"[INFO] Inserted {len(trades)} trades for {ticker} from {accession}")
-            
-            # Be polite to SEC
-            time.sleep(0.5)
-        
-        if ticker_trades > 0:
-            # Update summary for this ticker
-            update_summary(ticker, days=90)
-            processed_tickers += 1
-        else:
-            skipped_tickers += 1
-        
-        print()  # Blank line between tickers
-    
+        ticker_ciks[ticker] = cik
+
+    inserted = []
+    stats = asyncio.run(run_edgar_update(ticker_ciks, max_days=120, full_rescan=full_rescan,
+                                         inserted=inserted))
+    skipped_tickers += stats["skipped_tickers"]
+
     print(f"\n{'='*50}")
-    print(f"[INFO] Processed: {processed_tickers} tickers")
+    print(f"[INFO] Processed: {stats['processed_tickers']} tickers")
     print(f"[INFO] Skipped: {skipped_tickers} tickers")
-    print(f"[INFO] Total trades processed: {total_trades}")
-    
-    # Rebuild all summaries to ensure consistency
-    print(f"\n[INFO] Rebuilding all summaries...")
-    rebuild_all_summaries(days=90)
-    
+    print(f"[INFO] Filings processed: {stats['filings_processed']} "
+          f"({stats['filings_skipped']} already processed, skipped)")
+    print(f"[INFO] New trades inserted: {stats['total_trades']}")
+    print(f"[INFO] Known trades filtered before writing: {stats['known_trades_filtered']}")
+    print(f"[INFO] SEC requests: {stats['sec_requests']} in {stats['elapsed_s']:.1f}s "
+          f"({stats['requests_per_s']:.2f} req/s)")
+
+    print(f"[INFO] Form 4 documents: {stats['documents_fetched']} fetched, "
+          f"{stats['store_hits']} served from local store")
+
+    cache = SUBMISSIONS_CACHE.stats
+    print(f"[INFO] Submissions cache: {cache['hits']} hits, {cache['misses']} misses, "
+          f"{cache['not_modified']} not modified, "
+          f"{cache['bytes_saved'] / 1e6:.1f} MB saved, "
+          f"{cache['bytes_downloaded'] / 1e6:.1f} MB downloaded")
+    print_transport_stats()
+    print_breaker_states()
+
+    # Apply this run's deltas (periodically re-verified against a full rebuild)
+    print(f"\n[INFO] Updating insider summaries...")
+    apply_new_trades(inserted, days=90, verify=verify_summary)
+
     print(f"\n[OK] EDGAR insider update complete")
 
 
 if __name__ == "__main__":
-    update_insiders_from_edgar()
+    parser = argparse.ArgumentParser(description="Update insider transactions from SEC EDGAR")
+    parser.add_argument("--full", action="store_true",
+                        help="reprocess every filing in the window, ignoring watermarks")
+    parser.add_argument("--verify-summary", action="store_true", default=None,
+                        help="re-aggregate the whole summary window and repair drift")
+    args = parser.parse_args()
 
+    update_insiders_from_edgar(full_rescan=args.full, verify_summary=args.verify_summary)
@@ -0,0 +1,124 @@
+"""
+Local SQLite store for EDGAR state.
+
+Form 4 documents never change once filed, so each one is kept here
+(zlib-compressed, keyed by accession number) and downloaded exactly once.
+Per-CIK watermarks record the newest filing already processed so daily
+runs only look at filings newer than that, and completed backfill
+quarters are recorded so a backfill can resume where it stopped.
+"""
+
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+from local_cache import cache_path
+
+
+class EdgarStore:
+    """SQLite-backed store shared by the EDGAR fetch workers (thread-safe)."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or cache_path("edgar.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS form4_documents (
+                accession TEXT PRIMARY KEY,
+                url TEXT,
+                body BLOB NOT NULL,
+                fetched_at TEXT
+            )
+        """)
+        # Keyed by ticker too: share classes (GOOG/GOOGL) share one CIK
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cik_watermarks (
+                cik TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                accession TEXT NOT NULL,
+                filing_date TEXT NOT NULL,
+                updated_at TEXT,
+                PRIMARY KEY (cik, ticker)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_quarters (
+                year INTEGER NOT NULL,
+                quarter INTEGER NOT NULL,
+                filings INTEGER,
+                trades INTEGER,
+                completed_at TEXT,
+                PRIMARY KEY (year, quarter)
+            )
+        """)
+        self._conn.commit()
+
+    def get_document(self, accession: str) -> str | None:
+        """Return the stored document text for an accession number, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM form4_documents WHERE accession = ?", (accession,)
+            ).fetchone()
+        if not row:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put_document(self, accession: str, url: str, text: str):
+        """Store a fetched document. Existing entries are left untouched."""
+        body = zlib.compress(text.encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO form4_documents (accession, url, body, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                (accession, url, body, datetime.utcnow().isoformat())
+            )
+            self._conn.commit()
+
+    def get_watermark(self, cik: str, ticker: str):
+        """Return (accession, filing_date) of the newest processed filing, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT accession, filing_date FROM cik_watermarks WHERE cik = ? AND ticker = ?",
+                (cik, ticker)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], datetime.strptime(row[1], "%Y-%m-%d").date()
+
+    def set_watermark(self, cik: str, ticker: str, accession: str, filing_date):
+        """Record the newest processed filing for a CIK/ticker."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cik_watermarks (cik, ticker, accession, filing_date, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (cik, ticker) DO UPDATE SET accession = excluded.accession, "
+                "filing_date = excluded.filing_date, updated_at = excluded.updated_at",
+                (cik, ticker, accession, filing_date.isoformat(), datetime.utcnow().isoformat())
+            )
+            self._conn.commit()
+
+    def is_quarter_done(self, year: int, quarter: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM backfill_quarters WHERE year = ? AND quarter = ?", (year, quarter)
+            ).fetchone()
+        return row is not None
+
+    def mark_quarter_done(self, year: int, quarter: int, filings: int, trades: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfill_quarters (year, quarter, filings, trades, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (year, quarter, filings, trades, datetime.utcnow().isoformat())
+            )
+            self._conn.commit()
+
+    def document_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM form4_documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -5,31 +5,18 @@ Fetches insider trading data from Finviz HTML and updates Supabase.
 Run daily via cron/Task Scheduler.
 """
 
-import requests
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-from supabase import create_client
-import os
+from datetime import datetime
 import time
 from dotenv import load_dotenv
 from ticker_list import TRACKED_TICKERS
+from supabase_client import upsert_trades_counted, refresh_summaries, trade_key
+from db_writer import BatchWriter
+from known_trades import KnownTradeIndex
+import http_transport
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
-# Finviz requires browser-like User-Agent
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-}
-
-
 def normalize_transaction_type(tx_type):
     """Normalize transaction type to 'buy' or 'sell'"""
     if not tx_type:
@@ -53,7 +40,8 @@ def fetch_finviz_html(ticker):
     url = f"https://finviz.com/quote.ashx?t={ticker}"
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        # Finviz requires browser-like User-Agent (http_transport.HOST_HEADERS)
+        response = http_transport.get(url, timeout=10)
         if response.status_code == 200:
             return response.text
         else:
@@ -200,15 +188,14 @@ def parse_finviz_date(date_str):
     return None
 
 
-def upsert_transactions_to_supabase(ticker, transactions):
-    """Upsert transactions into Supabase with deduplication"""
-    inserted = 0
-    
+def transaction_rows(ticker, transactions):
+    """insider_transactions rows for a ticker's parsed Finviz trades"""
+    rows = []
     for tx in transactions:
         if not tx.get("transaction_date") or not tx.get("shares"):
             continue
         
-        data = {
+        rows.append({
             "ticker": ticker,
             "insider_name": tx.get("insider_name", "Unknown"),
             "insider_title": tx.get("insider_title"),
@@ -218,117 +205,42 @@ def upsert_transactions_to_supabase(ticker, transactions):
             "filing_date": tx.get("filing_date") or tx.get("transaction_date"),
             "price_per_share": tx.get("price_per_share"),
             "total_value": tx.get("total_value")
-        }
-        
-        try:
-            # Check if transaction already exists
-            existing = supabase.table("insider_transactions") \
-                .select("id") \
-                .eq("ticker", data["ticker"]) \
-                .eq("insider_name", data["insider_name"]) \
-                .eq("transaction_date", data["transaction_date"]) \
-                .eq("shares", data["shares"]) \
-                .execute()
-            
-            if existing.data and len(existing.data) > 0:
-                # Update existing record
-                result = supabase.table("insider_transactions") \
-                    .update(data) \
-                    .eq("id", existing.data[0]["id"]) \
-                    .execute()
-            else:
-                # Insert new record
-                result = supabase.table("insider_transactions") \
-                    .insert(data) \
-                    .execute()
-            
-            # Count as inserted/updated
-            inserted += 1
-        except Exception as e:
-            # Log all errors for debugging
-            error_str = str(e).lower()
-            if "duplicate" not in error_str and "unique" not in error_str:
-                print(f"    X Error inserting transaction for {data.get('ticker', '?')}: {e}")
-            # Don't count failed inserts
-            continue
+        })
     
-    return inserted
+    return rows
+
+
+def upsert_transactions_to_supabase(ticker, transactions):
+    """Upsert a ticker's transactions in one set-based call.
+
+    Returns (inserted, updated) counts.
+    """
+    return upsert_trades_counted(transaction_rows(ticker, transactions))
+
+
+def counted_trade_writer(counts):
+    """Write-behind writer that upserts batches set-based and adds to counts."""
+    def write(rows):
+        failed = []
+        inserted, updated = upsert_trades_counted(rows, failed=failed)
+        counts["inserted"] += inserted
+        counts["updated"] += updated
+        return failed
+    return BatchWriter("insider_transactions", write, key=trade_key)
 
 
 def update_insider_summary():
-    """Update insider_summary table with 90-day aggregates"""
-    cutoff = (datetime.utcnow() - timedelta(days=90)).date().isoformat()
-    
-    # Get all tickers
-    tickers_result = supabase.table("stocks").select("ticker").execute()
-    tickers = [t["ticker"] for t in tickers_result.data] if tickers_result.data else []
-    
-    updated_count = 0
-    
-    for ticker in tickers:
-        # Get transactions for last 90 days
-        result = supabase.table("insider_transactions") \
-            .select("transaction_type, shares, total_value") \
-            .eq("ticker", ticker) \
-            .gte("transaction_date", cutoff) \
-            .execute()
-        
-        if not result.data:
-            continue
-        
-        buys = 0
-        sells = 0
-        total_bought_value = 0
-        total_sold_value = 0
-        
-        for tx in result.data:
-            if tx["transaction_type"] == "buy":
-                buys += 1
-                if tx.get("total_value"):
-                    total_bought_value += tx["total_value"]
-            elif tx["transaction_type"] == "sell":
-                sells += 1
-                if tx.get("total_value"):
-                    total_sold_value += tx["total_value"]
-        
-        net_activity = total_bought_value - total_sold_value
-        
-        # Determine verdict based on net activity
-        if net_activity > 0:
-            verdict = "accumulating"
-        elif net_activity < 0:
-            verdict = "distributing"
-        else:
-            verdict = "neutral"
-        
-        summary_data = {
-            "ticker": ticker,
-            "buys_90d": buys,
-            "sells_90d": sells,
-            "total_bought_value_90d": total_bought_value,
-            "total_sold_value_90d": total_sold_value,
-            "net_activity_90d": net_activity,
-            "verdict": verdict,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        try:
-            supabase.table("insider_summary").upsert(
-                summary_data,
-                on_conflict="ticker"
-            ).execute()
-            updated_count += 1
-        except Exception as e:
-            print(f"  X Error updating summary for {ticker}: {e}")
-    
-    return updated_count
+    """Update insider_summary table with 90-day aggregates (one server-side call)"""
+    return refresh_summaries(90, measure="value") or 0
 
 
 def main():
     print(f"Starting Finviz insider update at {datetime.utcnow().isoformat()}")
     print(f"Tracking {len(TRACKED_TICKERS)} tickers\n")
     
-    total_inserted = 0
+    counts = {"inserted": 0, "updated": 0}
+    known = KnownTradeIndex()
+    writer = counted_trade_writer(counts)
     processed_count = 0
     skipped_count = 0
     
@@ -352,18 +264,25 @@ def main():
         
         print(f"  Parsed {len(transactions)} trades")
         
-        inserted = upsert_transactions_to_supabase(ticker, transactions)
-        total_inserted += inserted
+        rows = known.filter_new(transaction_rows(ticker, transactions))
+        writer.put_many(rows)
         processed_count += 1
-        print(f"  Inserted {inserted} trades into Supabase\n")
+        print(f"  Queued {len(rows)} new trades for Supabase\n")
         
         # 1-second delay between tickers
         time.sleep(1)
     
+    writer.close()
+    
     print(f"\n{'='*50}")
     print(f"Processed: {processed_count} tickers")
     print(f"Skipped: {skipped_count} tickers")
-    print(f"Total transactions inserted: {total_inserted}")
+    print(f"Total transactions inserted: {counts['inserted']}")
+    print(f"Total transactions updated: {counts['updated']}")
+    print(f"Known transactions filtered: {known.stats['filtered']}")
+    known.print_stats()
+    writer.print_stats()
+    http_transport.print_transport_stats()
     
     # Update summary
     print(f"\nUpdating insider_summary...")
@@ -0,0 +1,126 @@
+"""
+Shared HTTP transport for every pipeline fetcher.
+
+One pooled keep-alive requests.Session per host, gzip/deflate content
+negotiation and per-host default headers (SEC wants a declared User-Agent
+with contact details, the HTML sources want a browser one). Connection
+handshakes and bytes on the wire are counted per host so connection reuse
+and compression savings are measurable.
+"""
+
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EDGAR_USER_AGENT = os.getenv("EDGAR_USER_AGENT") or "SilentWhale/1.0 (contact: your-robin@digiget.uk)"
+
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+SEC_HEADERS = {"User-Agent": EDGAR_USER_AGENT}
+BROWSER_HEADERS = {"User-Agent": BROWSER_USER_AGENT}
+
+# Default headers per host; hosts not listed get DEFAULT_HEADERS only
+HOST_HEADERS = {
+    "data.sec.gov": SEC_HEADERS,
+    "www.sec.gov": SEC_HEADERS,
+    "finviz.com": BROWSER_HEADERS,
+    "query1.finance.yahoo.com": BROWSER_HEADERS,
+    "www.nasdaq.com": BROWSER_HEADERS,
+    "openinsider.com": BROWSER_HEADERS,
+}
+
+# Keep-alive connections kept per host (>= the number of concurrent workers)
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE") or 32)
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _record(host: str, **counts):
+    with _lock:
+        host_stats = _stats.setdefault(
+            host, {"requests": 0, "handshakes": 0, "bytes_on_wire": 0, "bytes_decoded": 0}
+        )
+        for key, value in counts.items():
+            host_stats[key] += value
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _record(self.host, handshakes=1)
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _record(self.host, handshakes=1)
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count every new (TCP/TLS) connection."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _session_for(host: str) -> requests.Session:
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = _PooledAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            session.headers.update(HOST_HEADERS.get(host, {}))
+            _sessions[host] = session
+        return session
+
+
+def get(url: str, headers: dict | None = None, **kwargs) -> requests.Response:
+    """GET through the host's pooled session. Extra headers are merged over its defaults."""
+    host = urlsplit(url).hostname or ""
+    response = _session_for(host).get(url, headers=headers, **kwargs)
+
+    if kwargs.get("stream"):
+        _record(host, requests=1)
+    else:
+        # raw.tell() is what came over the socket, before gzip/deflate decoding
+        _record(host, requests=1, bytes_on_wire=response.raw.tell(),
+                bytes_decoded=len(response.content))
+    return response
+
+
+def transport_stats() -> dict:
+    """Per-host counters: requests, handshakes, bytes_on_wire, bytes_decoded."""
+    with _lock:
+        return {host: dict(counts) for host, counts in _stats.items()}
+
+
+def print_transport_stats():
+    for host, counts in sorted(transport_stats().items()):
+        print(f"[INFO] HTTP {host}: {counts['requests']} requests, "
+              f"{counts['handshakes']} handshakes, "
+              f"{counts['bytes_on_wire'] / 1e3:.1f} KB on wire "
+              f"({counts['bytes_decoded'] / 1e3:.1f} KB decoded)")
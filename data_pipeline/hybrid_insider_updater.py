@@ -10,31 +10,17 @@ Updates Supabase insider_transactions and insider_summary tables.
 Run daily via cron/Task Scheduler.
 """
 
-import requests
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-from supabase import create_client
-import os
+from datetime import datetime
 import time
 from dotenv import load_dotenv
 from ticker_list import TRACKED_TICKERS
+from supabase_client import refresh_summaries, trade_writer
+from known_trades import KnownTradeIndex
+import http_transport
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
-# Headers for all requests
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-}
-
-
 def normalize_transaction_type(tx_type):
     """Normalize transaction type to 'buy' or 'sell'"""
     if not tx_type:
@@ -80,7 +66,8 @@ def fetch_with_retry(url, max_retries=3, timeout=10):
     """Fetch URL with retry logic and backoff"""
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=HEADERS, timeout=timeout)
+            # Browser User-Agent comes from http_transport.HOST_HEADERS
+            response = http_transport.get(url, timeout=timeout)
             if response.status_code == 200:
                 return response
             elif response.status_code == 404:
@@ -341,9 +328,9 @@ def fetch_insider_transactions(ticker):
     return []
 
 
-def insert_transactions(ticker, transactions):
-    """Insert transactions into Supabase with deduplication"""
-    inserted = 0
+def insert_transactions(ticker, transactions, writer, known):
+    """Queue transactions not stored yet for a background upsert"""
+    rows = []
     
     for tx in transactions:
         if not tx.get("transaction_date"):
@@ -361,96 +348,27 @@ def insert_transactions(ticker, transactions):
             "total_value": tx.get("total_value")
         }
         
-        try:
-            # Upsert to handle duplicates
-            result = supabase.table("insider_transactions").upsert(
-                data,
-                on_conflict="ticker,insider_name,transaction_date,shares"
-            ).execute()
-            
-            if result.data:
-                inserted += 1
-        except Exception as e:
-            # Skip errors (duplicates handled by upsert)
-            error_str = str(e).lower()
-            if "duplicate" not in error_str and "unique" not in error_str:
-                print(f"    ✗ Error inserting transaction: {e}")
-            continue
+        rows.append(data)
     
-    return inserted
+    rows = known.filter_new(rows)
+    writer.put_many(rows)
+    return len(rows)
 
 
 def update_insider_summary():
-    """Update insider_summary table with 90-day aggregates"""
-    cutoff = (datetime.utcnow() - timedelta(days=90)).date().isoformat()
-    
-    # Get all tickers
-    tickers_result = supabase.table("stocks").select("ticker").execute()
-    tickers = [t["ticker"] for t in tickers_result.data] if tickers_result.data else []
-    
-    for ticker in tickers:
-        # Get transactions for last 90 days
-        result = supabase.table("insider_transactions") \
-            .select("transaction_type, shares, total_value") \
-            .eq("ticker", ticker) \
-            .gte("transaction_date", cutoff) \
-            .execute()
-        
-        if not result.data:
-            continue
-        
-        buys = 0
-        sells = 0
-        total_bought_value = 0
-        total_sold_value = 0
-        
-        for tx in result.data:
-            if tx["transaction_type"] == "buy":
-                buys += 1
-                if tx.get("total_value"):
-                    total_bought_value += tx["total_value"]
-            elif tx["transaction_type"] == "sell":
-                sells += 1
-                if tx.get("total_value"):
-                    total_sold_value += tx["total_value"]
-        
-        net_activity = total_bought_value - total_sold_value
-        
-        # Determine verdict
-        if net_activity > 0:
-            verdict = "accumulating"
-        elif net_activity < 0:
-            verdict = "distributing"
-        else:
-            verdict = "neutral"
-        
-        summary_data = {
-            "ticker": ticker,
-            "buys_90d": buys,
-            "sells_90d": sells,
-            "total_bought_value_90d": total_bought_value,
-            "total_sold_value_90d": total_sold_value,
-            "net_activity_90d": net_activity,
-            "verdict": verdict,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        try:
-            supabase.table("insider_summary").upsert(
-                summary_data,
-                on_conflict="ticker"
-            ).execute()
-        except Exception as e:
-            print(f"  ✗ Error updating summary for {ticker}: {e}")
+    """Update insider_summary table with 90-day aggregates (one server-side call)"""
+    refresh_summaries(90, measure="value")
 
 
 def main():
     print(f"Starting hybrid insider update at {datetime.utcnow().isoformat()}")
     print(f"Tracking {len(TRACKED_TICKERS)} tickers\n")
     
-    total_inserted = 0
+    total_queued = 0
     processed_count = 0
     skipped_count = 0
+    known = KnownTradeIndex()
+    writer = trade_writer()
     
     for ticker in TRACKED_TICKERS:
         print(f"Processing {ticker}...")
@@ -462,18 +380,24 @@ def main():
             print(f"  ⏭ Skipped (no transactions)\n")
             continue
         
-        inserted = insert_transactions(ticker, transactions)
-        total_inserted += inserted
+        queued = insert_transactions(ticker, transactions, writer, known)
+        total_queued += queued
         processed_count += 1
-        print(f"  ✓ Inserted {inserted} transactions\n")
+        print(f"  ✓ Queued {queued} transactions\n")
         
         # Small delay to avoid rate limiting
         time.sleep(0.5)
     
+    writer.close()
+    
     print(f"\n{'='*50}")
     print(f"Processed: {processed_count} tickers")
     print(f"Skipped: {skipped_count} tickers")
-    print(f"Total transactions inserted: {total_inserted}")
+    print(f"Total transactions written: {writer.stats['written']} of {total_queued}")
+    print(f"Known transactions filtered: {known.stats['filtered']}")
+    known.print_stats()
+    writer.print_stats()
+    http_transport.print_transport_stats()
     
     # Update summary
     print(f"\nUpdating insider_summary...")
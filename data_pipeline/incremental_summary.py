@@ -0,0 +1,192 @@
+"""
+Incremental maintenance of the 90-day insider_summary.
+
+Instead of rebuilding every ticker's summary each run, only the tickers
+touched since the last run are recomputed: those with trades inserted this
+run and those with trades that slid out of the window since the last run
+(transaction_date between the previous and the current cutoff). Their rows
+are recomputed from insider_transactions by refresh_insider_summary
+(supabase_client.refresh_summaries), so every summary column is rewritten
+with the same measure as update_summary, whichever updater wrote the row
+last.
+
+The last cutoff is kept in a small state file under the local cache. Every
+SUMMARY_VERIFY_EVERY runs (and whenever there is no usable state, or the
+refresh function is unavailable) the whole window is re-aggregated with the
+same logic as supabase_client.update_summary and any drifted rows are
+reported and repaired. Drift can come from writers that bypass save_trades
+(the finviz/hybrid/RSS updaters).
+"""
+
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from local_cache import cache_path, _write_json
+from supabase_client import get_client, iter_rows, refresh_summaries
+
+STATE_FILE = "insider_summary_state.json"
+
+# Full verification every N incremental runs
+SUMMARY_VERIFY_EVERY = int(os.getenv("SUMMARY_VERIFY_EVERY") or 7)
+
+WRITE_CHUNK = 1000
+IN_CHUNK = 200
+
+
+def _load_state() -> dict | None:
+    try:
+        with open(cache_path(STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(state: dict):
+    _write_json(cache_path(STATE_FILE), state)
+
+
+def _clear_state():
+    try:
+        os.remove(cache_path(STATE_FILE))
+    except OSError:
+        pass
+
+
+def summarize(buys: int, sells: int) -> dict:
+    """Summary columns from bought/sold share totals (same rules as update_summary)."""
+    net = buys - sells
+    verdict = "neutral"
+    if net > 0:
+        verdict = "accumulating"
+    elif net < 0:
+        verdict = "distributing"
+    return {"buys_90d": buys, "sells_90d": sells, "net_activity_90d": net, "verdict": verdict}
+
+
+def _add(totals: dict, row: dict, sign: int):
+    shares = (row.get("shares") or 0) * sign
+    if row.get("transaction_type") == "buy":
+        totals[row["ticker"]][0] += shares
+    elif row.get("transaction_type") == "sell":
+        totals[row["ticker"]][1] += shares
+
+
+def _refresh(tickers: list[str], days: int) -> bool:
+    """Recompute `tickers` from insider_transactions; False if the RPC failed."""
+    for i in range(0, len(tickers), IN_CHUNK):
+        if refresh_summaries(days, measure="shares", tickers=tickers[i:i + IN_CHUNK]) is None:
+            return False
+    return True
+
+
+def _write_summaries(totals: dict):
+    """Fallback repair when refresh_insider_summary is not installed (share columns only)."""
+    now = datetime.utcnow().isoformat()
+    rows = [{"ticker": ticker, **summarize(buys, sells), "summary_measure": "shares", "updated_at": now}
+            for ticker, (buys, sells) in totals.items()]
+    for i in range(0, len(rows), WRITE_CHUNK):
+        get_client().table("insider_summary").upsert(rows[i:i + WRITE_CHUNK], on_conflict="ticker").execute()
+
+
+def verify_summaries(days: int = 90, repair: bool = True) -> int:
+    """Re-aggregate the whole window and compare with insider_summary.
+
+    Only rows written with the shares measure (summary_measure) are
+    compared: the finviz/hybrid/RSS updaters store value-based rows and
+    update_all count-based ones, which are not drift. Tickers with trades
+    but no row at all are reported too. Returns the number of tickers
+    whose stored summary differed; with repair those rows are rewritten.
+    """
+    cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+    expected = defaultdict(lambda: [0, 0])
+    for row in iter_rows("insider_transactions", "ticker, transaction_type, shares",
+                         where=lambda q: q.gte("transaction_date", cutoff)):
+        _add(expected, row, 1)
+
+    stored = {r["ticker"]: r for r in iter_rows("insider_summary",
+                                                "ticker, buys_90d, sells_90d, net_activity_90d, verdict, "
+                                                "summary_measure",
+                                                key=("ticker",))}
+
+    drifted = {}
+    for ticker in expected.keys() | stored.keys():
+        buys, sells = expected.get(ticker, (0, 0))
+        want = summarize(buys, sells)
+        have = stored.get(ticker)
+        if have is None and not buys and not sells:
+            continue
+        if have is not None and have.get("summary_measure") != "shares":
+            continue  # another updater's measure
+        if have is None or any(have.get(k) != v for k, v in want.items()):
+            drifted[ticker] = (buys, sells)
+
+    if drifted:
+        print(f"[WARN] insider_summary drift for {len(drifted)} tickers, "
+              f"e.g. {sorted(drifted)[:5]}")
+        if repair and not _refresh(sorted(drifted), days):
+            _write_summaries(drifted)
+    else:
+        owned = sum(1 for r in stored.values() if r.get("summary_measure") == "shares")
+        print(f"[INFO] insider_summary verified ({owned} share-based rows match)")
+
+    _save_state({"days": days, "cutoff": cutoff, "runs_since_verify": 0,
+                 "verified_at": datetime.utcnow().isoformat()})
+    return len(drifted)
+
+
+def apply_new_trades(new_rows: list[dict], days: int = 90, verify: bool | None = None) -> dict:
+    """Bring insider_summary up to date after a run.
+
+    new_rows are the rows actually inserted this run (see save_trades'
+    `inserted`). verify=None verifies when due; True/False force it.
+    Returns {"tickers_updated", "aged_out", "added", "verified", "drifted"}.
+    """
+    stats = {"tickers_updated": 0, "aged_out": 0, "added": 0, "verified": False, "drifted": 0}
+    state = _load_state()
+    usable = state is not None and state.get("days") == days
+
+    if verify is None:
+        verify = not usable or state.get("runs_since_verify", 0) + 1 >= SUMMARY_VERIFY_EVERY
+
+    try:
+        if not verify:
+            old_cutoff = state["cutoff"]
+            cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+            affected = set()
+
+            if cutoff > old_cutoff:
+                aged = iter_rows("insider_transactions", "ticker",
+                                 key=("ticker", "transaction_date", "id"),
+                                 where=lambda q: q.gte("transaction_date", old_cutoff)
+                                                  .lt("transaction_date", cutoff))
+                for row in aged:
+                    affected.add(row["ticker"])
+                    stats["aged_out"] += 1
+
+            for row in new_rows:
+                if str(row.get("transaction_date") or "") >= cutoff:
+                    affected.add(row["ticker"])
+                    stats["added"] += 1
+
+            # Without the SQL function, re-aggregate the window client-side instead
+            verify = not _refresh(sorted(affected), days)
+
+        if verify:
+            stats["verified"] = True
+            stats["drifted"] = verify_summaries(days)
+            return stats
+    except Exception as e:
+        # Unknown how much was applied: force a full verification next run
+        _clear_state()
+        print(f"[ERROR] insider_summary update failed, next run will verify: {e}")
+        return stats
+
+    stats["tickers_updated"] = len(affected)
+    _save_state({**state, "cutoff": cutoff,
+                 "runs_since_verify": state.get("runs_since_verify", 0) + 1})
+    print(f"[INFO] insider_summary: {stats['tickers_updated']} tickers recomputed "
+          f"({stats['added']} new trades, {stats['aged_out']} aged out)")
+    return stats
@@ -0,0 +1,138 @@
+"""
+In-memory index of insider trades already in Supabase.
+
+Loaded once per run from the insider_transactions_unique keys in the active
+window, so scraped trades that are already stored are dropped before they
+reach the write path instead of being rejected by the database. Above
+KNOWN_TRADES_BLOOM_ABOVE keys a Bloom filter is used instead of a set; its
+positives are confirmed against the database, so a novel trade is never
+dropped because of a false positive.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+
+from supabase_client import TRADE_KEY, get_client, iter_rows
+
+# Same window the RSS updater prunes to
+KNOWN_TRADES_DAYS = int(os.getenv("KNOWN_TRADES_DAYS") or 120)
+KNOWN_TRADES_BLOOM_ABOVE = int(os.getenv("KNOWN_TRADES_BLOOM_ABOVE") or 500000)
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+
+
+def normalize_key(row: dict) -> tuple:
+    """insider_transactions_unique key with values as the database returns them."""
+    shares = row.get("shares")
+    date = row.get("transaction_date")
+    return (
+        row.get("ticker"),
+        row.get("insider_name"),
+        str(date)[:10] if date else None,
+        row.get("transaction_type"),
+        int(float(shares)) if shares is not None else None,
+    )
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hashable keys (double hashing on blake2b)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_FALSE_POSITIVE_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownTradeIndex:
+    """Keys of stored trades in the window; filter_new() drops the known ones."""
+
+    def __init__(self, days: int = KNOWN_TRADES_DAYS, client=None):
+        self.client = client or get_client()
+        self.cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+        self.stats = {"loaded": 0, "filtered": 0, "passed": 0, "confirm_queries": 0}
+        self._lock = threading.Lock()
+
+        count = self.client.table("insider_transactions") \
+            .select("id", count="exact") \
+            .gte("transaction_date", self.cutoff) \
+            .limit(1) \
+            .execute().count or 0
+        self.bloom = count > KNOWN_TRADES_BLOOM_ABOVE
+        self._keys = BloomFilter(count) if self.bloom else set()
+
+        for row in iter_rows("insider_transactions", ", ".join(TRADE_KEY),
+                             where=lambda q: q.gte("transaction_date", self.cutoff),
+                             client=self.client):
+            self._keys.add(normalize_key(row))
+            self.stats["loaded"] += 1
+
+    def _confirm(self, candidates: list[tuple]) -> set:
+        """Keys among Bloom positives that really are stored (one query per ticker)."""
+        by_ticker = {}
+        for key in candidates:
+            by_ticker.setdefault(key[0], []).append(key)
+
+        stored = set()
+        for ticker, keys in by_ticker.items():
+            dates = sorted({k[2] for k in keys})
+            res = self.client.table("insider_transactions") \
+                .select(", ".join(TRADE_KEY)) \
+                .eq("ticker", ticker) \
+                .in_("transaction_date", dates) \
+                .execute()
+            with self._lock:
+                self.stats["confirm_queries"] += 1
+            stored.update(normalize_key(r) for r in res.data or [])
+        return stored & set(candidates)
+
+    def filter_new(self, rows: list[dict]) -> list[dict]:
+        """Return only the rows not already stored (and not seen earlier this run)."""
+        candidates = []
+        for row in rows:
+            key = normalize_key(row)
+            # Outside the window the index knows nothing; let the database decide
+            if key[2] is not None and key[2] >= self.cutoff:
+                with self._lock:
+                    seen = key in self._keys
+                if seen:
+                    candidates.append(key)
+
+        known = set(candidates)
+        if self.bloom and candidates:
+            known = self._confirm(candidates)
+
+        novel = []
+        with self._lock:
+            for row in rows:
+                key = normalize_key(row)
+                if key in known:
+                    self.stats["filtered"] += 1
+                    continue
+                novel.append(row)
+                self.stats["passed"] += 1
+                if key[2] is not None and key[2] >= self.cutoff:
+                    self._keys.add(key)
+                    known.add(key)  # repeated within this batch
+        return novel
+
+    def print_stats(self):
+        s = self.stats
+        kind = "Bloom filter" if self.bloom else "hash set"
+        print(f"[INFO] Known-trade index ({kind}, {s['loaded']} keys since {self.cutoff}): "
+              f"{s['filtered']} known trades filtered, {s['passed']} passed to the writer"
+              + (f", {s['confirm_queries']} confirm queries" if self.bloom else ""))
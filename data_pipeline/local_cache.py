@@ -0,0 +1,175 @@
+"""
+Local on-disk cache shared by the pipeline scripts.
+
+Everything lives under CACHE_DIR (data_pipeline/.cache by default,
+override with PIPELINE_CACHE_DIR).
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+CACHE_DIR = os.getenv("PIPELINE_CACHE_DIR") or os.path.join(os.path.dirname(__file__), ".cache")
+
+
+def cache_path(*parts: str) -> str:
+    """Return a path under CACHE_DIR, creating its parent directory."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _write_json(path: str, data):
+    """Write JSON atomically so a crash never leaves a half-written file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class ConditionalCache:
+    """Disk cache for conditional GETs.
+
+    Stores a JSON document per key alongside its ETag / Last-Modified
+    validators. Callers send `validators(key)` as request headers and, on a
+    304, `load(key)` the stored document instead of downloading it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = {
+            "hits": 0,           # served from cache after a 304
+            "misses": 0,         # full download (no entry or entry changed)
+            "not_modified": 0,   # 304 responses received
+            "bytes_downloaded": 0,
+            "bytes_saved": 0,
+        }
+        # load/store run on fetch threads
+        self._lock = threading.Lock()
+
+    def _paths(self, key: str):
+        return (cache_path(self.name, f"{key}.json"),
+                cache_path(self.name, f"{key}.meta.json"))
+
+    def _meta(self, key: str) -> dict | None:
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def validators(self, key: str) -> dict:
+        """Conditional request headers for a cached key (empty if not cached)."""
+        meta = self._meta(key)
+        if not meta:
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, key: str):
+        """Return the cached document after a 304, or None if it is unreadable."""
+        body_path, _ = self._paths(key)
+        try:
+            with open(body_path, encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        meta = self._meta(key) or {}
+        with self._lock:
+            self.stats["not_modified"] += 1
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += meta.get("body_bytes", 0)
+        return doc
+
+    def store(self, key: str, doc, response):
+        """Save a freshly downloaded document with the response's validators."""
+        body_bytes = len(response.content)
+        with self._lock:
+            self.stats["misses"] += 1
+            self.stats["bytes_downloaded"] += body_bytes
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return  # Nothing to revalidate with next time
+
+        body_path, meta_path = self._paths(key)
+        _write_json(body_path, doc)
+        _write_json(meta_path, {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_bytes": body_bytes,
+        })
+
+
+class FingerprintCache:
+    """Per-column hashes of the last payload written for each row key.
+
+    diff(row) tells whether a row is unchanged ("skip"), differs in some
+    columns ("partial", payload = key + changed columns + always-sent
+    columns) or was never written ("full"). Call remember(row) once the
+    write succeeded and save() at the end of the run.
+    """
+
+    def __init__(self, name: str, key: str = "ticker", always_send: tuple = ("updated_at",)):
+        self.path = cache_path("fingerprints", f"{name}.json")
+        self.key = key
+        self.always_send = always_send
+        self.stats = {"skipped": 0, "partial": 0, "full": 0}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._hashes = json.load(f)
+        except (OSError, ValueError):
+            self._hashes = {}
+
+    @staticmethod
+    def _hash(value) -> str:
+        text = json.dumps(value, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+    def _column_hashes(self, row: dict) -> dict:
+        return {col: self._hash(value) for col, value in row.items()
+                if col != self.key and col not in self.always_send}
+
+    def diff(self, row: dict):
+        """Return (kind, payload) with kind in "skip", "partial", "full"."""
+        hashes = self._column_hashes(row)
+        with self._lock:
+            known = self._hashes.get(str(row[self.key]))
+        if known is None:
+            kind, payload = "full", row
+        else:
+            changed = [col for col, h in hashes.items() if known.get(col) != h]
+            if not changed:
+                kind, payload = "skip", None
+            else:
+                kind = "partial"
+                payload = {self.key: row[self.key]}
+                payload.update({col: row[col] for col in changed})
+                payload.update({col: row[col] for col in self.always_send if col in row})
+        with self._lock:
+            self.stats["skipped" if kind == "skip" else kind] += 1
+        return kind, payload
+
+    def remember(self, row: dict):
+        """Record a successfully written payload (full or partial)."""
+        hashes = self._column_hashes(row)
+        with self._lock:
+            self._hashes.setdefault(str(row[self.key]), {}).update(hashes)
+
+    def save(self):
+        with self._lock:
+            _write_json(self.path, self._hashes)
+
+    def print_stats(self, label: str):
+        s = self.stats
+        print(f"[INFO] {label}: {s['full']} full writes, {s['partial']} partial, "
+              f"{s['skipped']} unchanged rows skipped")
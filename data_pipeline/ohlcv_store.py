@@ -0,0 +1,203 @@
+"""
+Local memory-mapped OHLCV store.
+
+One file of fixed-size records (date, open, high, low, close, volume) per
+ticker under CACHE_DIR/ohlcv. A daily sync downloads only the bars since
+the last stored date (plus a few overlapping days), in the same
+multi-symbol groups as price_history, and appends them. Indicator code
+reads zero-copy NumPy views of the memory-mapped file.
+
+Prices are Yahoo's auto-adjusted series, so a split or dividend rewrites
+past bars. The overlapping bars are compared with what is stored: when they
+disagree (or do not overlap at all, e.g. after a long gap) the ticker's
+full history is downloaded again and the file rewritten.
+
+Usage:
+    python ohlcv_store.py                 # sync every ticker in the tickers table
+    python ohlcv_store.py AAPL MSFT --rebuild
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from local_cache import cache_path
+from price_history import HISTORY_GROUP_SIZE, iter_history
+
+BAR = np.dtype([("date", "datetime64[D]"), ("open", "f8"), ("high", "f8"),
+                ("low", "f8"), ("close", "f8"), ("volume", "f8")])
+COLUMNS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+
+# Calendar days re-downloaded before the last stored bar to check for re-adjustment
+OHLCV_OVERLAP_DAYS = int(os.getenv("OHLCV_OVERLAP_DAYS") or 10)
+# Relative close difference on overlapping bars that counts as a re-adjustment
+OHLCV_ADJUST_TOLERANCE = 1e-4
+
+
+def to_bars(hist: pd.DataFrame) -> np.ndarray:
+    """Records from an OHLCV frame (rows without a close dropped)."""
+    hist = hist.dropna(subset=["Close"])
+    bars = np.empty(len(hist), dtype=BAR)
+    bars["date"] = hist.index.values.astype("datetime64[D]")
+    for column, field in COLUMNS.items():
+        bars[field] = hist[column].to_numpy(dtype="f8", na_value=np.nan)
+    return bars
+
+
+class OHLCVStore:
+    """Per-ticker OHLCV files; sync() appends, bars()/column() map them read-only."""
+
+    def __init__(self, root: str | None = None):
+        self.root = root or os.path.dirname(cache_path("ohlcv", "_"))
+        self.stats = {"appended": 0, "created": 0, "rebuilt": 0, "unchanged": 0, "missing": 0}
+
+    def path(self, ticker: str) -> str:
+        return os.path.join(self.root, f"{ticker}.bin")
+
+    # --- reading -------------------------------------------------------
+
+    def bars(self, ticker: str) -> np.ndarray:
+        """Read-only memory-mapped records (empty if nothing is stored)."""
+        path = self.path(ticker)
+        try:
+            count = os.path.getsize(path) // BAR.itemsize
+        except OSError:
+            count = 0
+        if not count:
+            return np.empty(0, dtype=BAR)
+        # Ignores a partial record left by an interrupted append
+        return np.memmap(path, dtype=BAR, mode="r", shape=(count,))
+
+    def column(self, ticker: str, field: str = "close") -> np.ndarray:
+        """Zero-copy view of one field."""
+        return self.bars(ticker)[field]
+
+    def history(self, ticker: str) -> pd.DataFrame:
+        """OHLCV frame shaped like Ticker.history() (for pandas-based code)."""
+        bars = self.bars(ticker)
+        index = pd.DatetimeIndex(bars["date"], name="Date")
+        return pd.DataFrame({column: bars[field] for column, field in COLUMNS.items()}, index=index)
+
+    def frame(self, tickers: list[str], field: str = "close", bars: int | None = None) -> pd.DataFrame:
+        """(date x ticker) matrix of one field from each ticker's last `bars` bars."""
+        series = {}
+        for ticker in tickers:
+            records = self.bars(ticker)[-bars:] if bars else self.bars(ticker)
+            series[ticker] = pd.Series(records[field], index=pd.DatetimeIndex(records["date"]))
+        return pd.DataFrame(series, columns=tickers, dtype="f8")
+
+    def tickers(self) -> list[str]:
+        """Every ticker with a file in the store."""
+        return sorted(f[:-len(".bin")] for f in os.listdir(self.root) if f.endswith(".bin"))
+
+    def last_date(self, ticker: str):
+        bars = self.bars(ticker)
+        return bars["date"][-1] if len(bars) else None
+
+    # --- writing -------------------------------------------------------
+
+    def _tail(self, ticker: str, since) -> np.ndarray:
+        """Copy of the stored bars on or after `since` (no mapping kept open)."""
+        bars = self.bars(ticker)
+        tail = np.array(bars[bars["date"] >= since])
+        del bars
+        return tail
+
+    def _rewrite(self, ticker: str, bars: np.ndarray):
+        path = self.path(ticker)
+        tmp = path + ".tmp"
+        bars.tofile(tmp)
+        os.replace(tmp, path)
+
+    def _append(self, ticker: str, bars: np.ndarray) -> bool:
+        """Merge freshly downloaded bars; False if the ticker needs a rebuild."""
+        path = self.path(ticker)
+        last = self.last_date(ticker)
+        if last is None:
+            self._rewrite(ticker, bars)
+            self.stats["created"] += 1
+            return True
+
+        stored = self._tail(ticker, bars["date"][0]) if len(bars) else np.empty(0, dtype=BAR)
+        # The last stored bar may have been a partial (intraday) one, so it is
+        # always replaced; earlier overlapping bars must match
+        settled = stored[stored["date"] < last]
+        fresh = dict(zip(bars["date"].tolist(), bars["close"]))
+        if not len(stored) or last.item() not in fresh:
+            return False  # no overlap: a gap the download did not cover
+        for day, close in zip(settled["date"].tolist(), settled["close"]):
+            new = fresh.get(day)
+            if new is None or abs(new - close) > OHLCV_ADJUST_TOLERANCE * abs(close):
+                return False
+
+        new_bars = bars[bars["date"] >= last]
+        if len(new_bars) == 1 and new_bars[0] == stored[-1]:
+            self.stats["unchanged"] += 1
+            return True
+
+        count = os.path.getsize(path) // BAR.itemsize
+        with open(path, "r+b") as f:
+            f.truncate((count - 1) * BAR.itemsize)
+            f.seek(0, os.SEEK_END)
+            new_bars.tofile(f)
+        self.stats["appended"] += len(new_bars) - 1
+        return True
+
+    def sync(self, tickers: list[str], group_size: int = HISTORY_GROUP_SIZE, rebuild: bool = False):
+        """Bring every ticker up to date, downloading only the missing days."""
+        by_start = defaultdict(list)
+        for ticker in tickers:
+            last = None if rebuild else self.last_date(ticker)
+            if last is None:
+                by_start[None].append(ticker)
+            else:
+                start = last.astype(date) - timedelta(days=OHLCV_OVERLAP_DAYS)
+                by_start[start.isoformat()].append(ticker)
+
+        full = list(by_start.pop(None, []))
+        for start, group in sorted(by_start.items()):
+            for prices in iter_history(group, start=start, group_size=group_size):
+                for ticker in prices.tickers:
+                    bars = to_bars(prices.history(ticker))
+                    if not len(bars):
+                        self.stats["missing"] += 1
+                    elif not self._append(ticker, bars):
+                        full.append(ticker)
+
+        for prices in iter_history(full, period="max", group_size=group_size):
+            for ticker in prices.tickers:
+                bars = to_bars(prices.history(ticker))
+                if not len(bars):
+                    self.stats["missing"] += 1
+                    continue
+                existed = self.last_date(ticker) is not None
+                self._rewrite(ticker, bars)
+                self.stats["rebuilt" if existed else "created"] += 1
+
+        self.print_stats(len(tickers))
+        return self.stats
+
+    def print_stats(self, total: int | None = None):
+        s = self.stats
+        print(f"[INFO] OHLCV store{f' ({total} tickers)' if total is not None else ''}: "
+              f"{s['appended']} bars appended, {s['unchanged']} unchanged, "
+              f"{s['created']} new, {s['rebuilt']} rebuilt after re-adjustment or gaps, "
+              f"{s['missing']} without data")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local OHLCV store")
+    parser.add_argument("tickers", nargs="*", help="default: every ticker in the tickers table")
+    parser.add_argument("--rebuild", action="store_true", help="download full history again")
+    args = parser.parse_args()
+
+    tickers = args.tickers
+    if not tickers:
+        from supabase_client import iter_rows
+        tickers = [t["ticker"] for t in iter_rows("tickers", "ticker", key=("ticker",))]
+
+    OHLCVStore().sync(tickers, rebuild=args.rebuild)
@@ -3,36 +3,24 @@ Populate cik_map table from SEC company_tickers.json
 Only inserts tickers that exist in the stocks table
 """
 
-import requests
 import json
 import os
-from supabase import create_client
 from dotenv import load_dotenv
+import http_transport
+from supabase_client import get_client, iter_rows
 
 # Load .env from the data_pipeline directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # SEC company_tickers.json URL
 SEC_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
 
 def main():
     print("Fetching SEC company_tickers.json...")
     
-    # Fetch the JSON file
-    headers = {
-        "User-Agent": "SilentWhale/1.0 (contact: your-robin@digiget.uk)"
-    }
-    
+    # Fetch the JSON file (SEC User-Agent comes from http_transport)
     try:
-        response = requests.get(SEC_TICKERS_URL, headers=headers, timeout=30)
+        response = http_transport.get(SEC_TICKERS_URL, timeout=30)
         response.raise_for_status()
         data = response.json()
     except Exception as e:
@@ -43,8 +31,7 @@ def main():
     
     # Get list of tickers from stocks table
     print("Fetching tracked tickers from stocks table...")
-    stocks_result = supabase.table("stocks").select("ticker").execute()
-    tracked_tickers = set([s["ticker"] for s in stocks_result.data] if stocks_result.data else [])
+    tracked_tickers = {s["ticker"] for s in iter_rows("stocks", "ticker", key=("ticker",))}
     
     print(f"Found {len(tracked_tickers)} tracked tickers")
     
@@ -69,7 +56,7 @@ def main():
     
     for ticker, cik in ticker_cik_map.items():
         try:
-            result = supabase.table("cik_map").upsert({
+            result = get_client().table("cik_map").upsert({
                 "ticker": ticker,
                 "cik": cik
             }, on_conflict="ticker").execute()
@@ -5,19 +5,11 @@ Run this once to set up your tracked tickers.
 
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+from supabase_client import get_client
 
 # Load .env from current directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # S&P 100 tickers
 TICKERS = [
     'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B', 'V', 'UNH',
@@ -41,7 +33,7 @@ def main():
     inserted = 0
     for ticker in TICKERS:
         try:
-            result = supabase.table("tickers").upsert({
+            result = get_client().table("tickers").upsert({
                 "ticker": ticker
             }, on_conflict="ticker").execute()
             
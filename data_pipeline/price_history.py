@@ -0,0 +1,160 @@
+"""
+Batched Yahoo Finance price history.
+
+Downloads the whole universe with multi-symbol yf.download calls
+(HISTORY_GROUP_SIZE symbols per request, fetched on yfinance's own thread
+pool) instead of one yf.Ticker(t).history() call per ticker, and aligns the
+result into one (date x ticker) frame per field. The BRK.B -> BRK-B symbol
+mapping lives here and nowhere else.
+
+Per-ticker code reads `prices.history(ticker)`, which returns the same
+OHLCV frame (auto-adjusted, rows without a close dropped) that
+Ticker.history() returned.
+"""
+
+import os
+
+import pandas as pd
+
+from rate_limiter import TokenBucket
+
+HISTORY_GROUP_SIZE = int(os.getenv("HISTORY_GROUP_SIZE") or 100)
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+# Ticker.info (quoteSummary) is still one request per ticker and is what
+# Yahoo rate-limits; default matches the old 1.2s sleep between tickers
+YAHOO_INFO_RPS = float(os.getenv("YAHOO_INFO_RPS") or 1 / 1.2)
+YAHOO_INFO_LIMIT = TokenBucket(YAHOO_INFO_RPS)
+
+
+def yahoo_symbol(ticker: str) -> str:
+    """Yahoo uses '-' for share classes (BRK.B -> BRK-B)."""
+    return ticker.replace(".", "-")
+
+
+def ticker_info(ticker: str) -> dict:
+    """Ticker.info for one ticker, throttled by YAHOO_INFO_LIMIT."""
+    import yfinance as yf
+
+    YAHOO_INFO_LIMIT.acquire()
+    return yf.Ticker(yahoo_symbol(ticker)).info
+
+
+class PriceHistory:
+    """Aligned price history: `frame[field]` is a (date x ticker) DataFrame."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    @property
+    def tickers(self) -> list[str]:
+        return list(self.frame.columns.get_level_values(1).unique())
+
+    @property
+    def close(self) -> pd.DataFrame:
+        return self.frame["Close"]
+
+    def field(self, name: str) -> pd.DataFrame:
+        return self.frame[name]
+
+    def history(self, ticker: str) -> pd.DataFrame:
+        """One ticker's OHLCV frame; empty if the download returned nothing."""
+        try:
+            hist = self.frame.xs(ticker, axis=1, level=1)
+        except KeyError:
+            return pd.DataFrame(columns=list(self.frame.columns.get_level_values(0).unique()))
+        return hist.dropna(subset=["Close"])
+
+
+def _download_group(tickers: list[str], period: str, fields, start: str | None = None) -> pd.DataFrame:
+    import yfinance as yf
+
+    symbols = {yahoo_symbol(t): t for t in tickers}
+    # With a start date yfinance ignores the period
+    span = {"start": start} if start else {"period": period}
+    data = yf.download(list(symbols), **span, group_by="column", auto_adjust=True,
+                       actions=False, threads=True, progress=False)
+    if data is None or data.empty:
+        return pd.DataFrame(columns=pd.MultiIndex.from_product([fields, tickers]))
+
+    # A single symbol comes back with flat columns
+    if not isinstance(data.columns, pd.MultiIndex):
+        data.columns = pd.MultiIndex.from_product([data.columns, list(symbols)])
+
+    data = data.rename(columns=symbols, level=1)
+    # Every requested ticker gets a column (all-NaN if Yahoo had nothing)
+    return data.reindex(columns=pd.MultiIndex.from_product([fields, tickers]))
+
+
+def iter_history(tickers: list[str], period: str = "1y", fields=FIELDS,
+                 group_size: int = HISTORY_GROUP_SIZE, start: str | None = None):
+    """Yield a PriceHistory per group of tickers.
+
+    Lets long periods ("max") be processed a group at a time instead of
+    holding decades of history for the whole universe in memory. `start`
+    (YYYY-MM-DD) overrides the period.
+    """
+    fields = list(fields)
+    for i in range(0, len(tickers), group_size):
+        group = tickers[i:i + group_size]
+        try:
+            frame = _download_group(group, period, fields, start)
+        except Exception as e:
+            print(f"[WARN] History download failed for {len(group)} tickers ({group[0]}..): {e}")
+            frame = pd.DataFrame(columns=pd.MultiIndex.from_product([fields, group]))
+        yield PriceHistory(frame)
+
+
+def download_history(tickers: list[str], period: str = "1y", fields=FIELDS,
+                     group_size: int = HISTORY_GROUP_SIZE) -> PriceHistory:
+    """Whole universe in one frame, aligned on the union of trading dates."""
+    fields = list(fields)
+    frames = [p.frame for p in iter_history(tickers, period, fields, group_size)]
+    frames = [f for f in frames if not f.empty]
+    frame = pd.concat(frames, axis=1).sort_index() if frames else pd.DataFrame()
+    # Tickers of a failed group stay present as all-NaN columns, like in _download_group
+    frame = frame.reindex(columns=pd.MultiIndex.from_product([fields, tickers]))
+
+    loaded = frame["Close"].notna().any()
+    missing = [t for t in tickers if not loaded[t]]
+    if missing:
+        print(f"[WARN] No price history for {len(missing)} tickers, e.g. {missing[:5]}")
+    print(f"[INFO] Price history: {int(loaded.sum())} tickers x {len(frame)} days "
+          f"in {-(-len(tickers) // group_size)} requests")
+    return PriceHistory(frame)
+
+
+class PriceCache:
+    """Per-run memo of single-ticker histories, keyed by (ticker, period).
+
+    Benchmarks such as SPY are downloaded once per run no matter how many
+    tickers or windows are compared against them.
+    """
+
+    def __init__(self):
+        self._hist = {}
+        self.stats = {"hits": 0, "downloads": 0}
+
+    def get(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        key = (ticker, period)
+        if key in self._hist:
+            self.stats["hits"] += 1
+        else:
+            self._hist[key] = next(iter_history([ticker], period)).history(ticker)
+            self.stats["downloads"] += 1
+        return self._hist[key]
+
+    def print_stats(self):
+        s = self.stats
+        print(f"[INFO] Price cache: {s['downloads']} downloads, {s['hits']} served from memory")
+
+
+def window_return(close: pd.Series, days: int) -> float | None:
+    """Percent return over the last `days` calendar days (Yahoo's "{days}d" period)."""
+    close = close.dropna()
+    if close.empty:
+        return None
+    window = close[close.index >= close.index[-1] - pd.Timedelta(days=days)]
+    if len(window) < 2:
+        return None
+    return (window.iloc[-1] / window.iloc[0] - 1) * 100
@@ -0,0 +1,113 @@
+"""
+Batched pruning of old insider_transactions.
+
+Instead of one unbounded DELETE (a long lock-holding statement that can time
+out through PostgREST), old rows are selected PRUNE_BATCH_SIZE at a time in
+idx_insider_ticker_date order (walked backwards: ticker desc, date asc, so
+each ticker's oldest rows come first) and deleted by primary key. The walk
+resumes at the last ticker reached, so every batch is a short index range
+scan, and a short pause between batches lets concurrent upserts through.
+
+Pruned rows can be archived to a local gzip JSONL file before they are
+deleted.
+
+Usage:
+    python prune_insiders.py                      # older than 120 days
+    python prune_insiders.py --days 365 --archive
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from local_cache import cache_path
+from supabase_client import get_client
+
+PRUNE_DAYS = 120
+PRUNE_BATCH_SIZE = int(os.getenv("PRUNE_BATCH_SIZE") or 250)
+PRUNE_PAUSE_S = float(os.getenv("PRUNE_PAUSE_S") or 0.1)
+
+
+def archive_path(cutoff: str) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return cache_path("archive", f"insider_transactions_before_{cutoff}_{stamp}.jsonl.gz")
+
+
+def prune_old_trades(days: int = PRUNE_DAYS, batch_size: int = PRUNE_BATCH_SIZE,
+                     archive: str | None = None, pause: float = PRUNE_PAUSE_S, client=None) -> int:
+    """Delete insider_transactions older than `days` in bounded batches.
+
+    With `archive` (a file path) the full rows are appended there as gzip
+    JSONL before each batch is deleted. Returns the number of rows deleted.
+    """
+    client = client or get_client()
+    cutoff = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+    columns = "*" if archive else "id, ticker"
+    archive_file = gzip.open(archive, "at", encoding="utf-8") if archive else None
+
+    deleted = 0
+    batch_no = 0
+    last_ticker = None
+    started = time.perf_counter()
+    try:
+        while True:
+            query = client.table("insider_transactions") \
+                .select(columns) \
+                .lt("transaction_date", cutoff)
+            if last_ticker is not None:
+                query = query.lte("ticker", last_ticker)
+            rows = query \
+                .order("ticker", desc=True) \
+                .order("transaction_date") \
+                .limit(batch_size) \
+                .execute().data or []
+            if not rows:
+                break
+
+            if archive_file:
+                for row in rows:
+                    archive_file.write(json.dumps(row, default=str) + "\n")
+                archive_file.flush()
+
+            ids = [row["id"] for row in rows]
+            res = client.table("insider_transactions").delete().in_("id", ids).execute()
+            removed = len(res.data or [])
+            batch_no += 1
+            deleted += removed
+            last_ticker = rows[-1]["ticker"]
+            print(f"[INFO] Prune batch {batch_no}: {removed} rows deleted "
+                  f"(through {last_ticker}, {deleted} total)")
+
+            if removed == 0:
+                # Nothing matched (e.g. RLS or a concurrent prune): avoid spinning
+                print(f"[WARN] Prune batch deleted nothing, stopping")
+                break
+            if pause:
+                time.sleep(pause)
+    finally:
+        if archive_file:
+            archive_file.close()
+
+    print(f"[INFO] Pruned {deleted} insider transactions before {cutoff} in {batch_no} batches "
+          f"({time.perf_counter() - started:.1f}s)"
+          + (f", archived to {archive}" if archive and deleted else ""))
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune old insider transactions in batches")
+    parser.add_argument("--days", type=int, default=PRUNE_DAYS, help="keep this many days")
+    parser.add_argument("--batch-size", type=int, default=PRUNE_BATCH_SIZE)
+    parser.add_argument("--archive", nargs="?", const="", default=None, metavar="FILE",
+                        help="archive pruned rows to gzip JSONL (default: under the local cache)")
+    args = parser.parse_args()
+
+    cutoff = (datetime.utcnow() - timedelta(days=args.days)).date().isoformat()
+    archive = None
+    if args.archive is not None:
+        archive = args.archive or archive_path(cutoff)
+
+    prune_old_trades(args.days, args.batch_size, archive)
@@ -0,0 +1,47 @@
+"""
+Thread-safe token bucket rate limiter.
+
+Used to keep all SEC EDGAR requests under the fair-access limit
+(~10 requests/second) no matter how many workers are fetching at once.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket shared by every thread that talks to one service.
+
+    Tokens refill continuously at `rate` per second up to `capacity`
+    (default 1, i.e. no bursts above the steady rate).
+    `acquire()` reserves a token and sleeps until it is due, so callers
+    are released in order at no more than `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+
+    def _reserve(self) -> float:
+        """Take one token (possibly going into debt) and return the wait time."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            self.granted += 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
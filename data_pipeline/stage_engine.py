@@ -0,0 +1,152 @@
+"""
+Vectorized Weinstein stage engine.
+
+Computes the 150-day MA, its 30-bar slope and the stage for every ticker of
+a (date x ticker) close matrix at once, with cumulative sums instead of a
+pandas rolling mean per ticker.
+
+Stage 1 = Basing (price below MA, MA flat)
+Stage 2 = Advancing (price above MA, MA rising)
+Stage 3 = Topping (price above MA, MA flat)
+Stage 4 = Declining (price below MA, MA falling)
+
+Each ticker is evaluated on its own bars (missing days skipped), exactly
+like the per-ticker calculate_stage it replaces:
+  - MA = mean of the last MA_WINDOW closes, slope = MA change vs the MA
+    SLOPE_BARS rows earlier (the MA series' iloc[-30]), NaN if that MA
+    does not exist yet
+  - fewer than `min_bars` closes -> no stage. update_stocks and the
+    comprehensive updater required 150 non-NaN MA points (MIN_BARS_FULL);
+    update_all only 150 closes (MIN_BARS_MA)
+"""
+
+import numpy as np
+import pandas as pd
+
+MA_WINDOW = 150            # ~30 weeks of trading days
+SLOPE_BARS = 29            # iloc[-1] vs iloc[-30]
+SLOPE_THRESHOLD = 0.02
+MIN_BARS_MA = MA_WINDOW
+MIN_BARS_FULL = 2 * MA_WINDOW - 1
+
+
+def _compact(close: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Move each column's valid closes to the bottom, keeping their order.
+
+    Returns (matrix, counts): row -1 is every ticker's latest close and
+    counts[j] the number of closes of ticker j.
+    """
+    valid = ~np.isnan(close)
+    order = np.argsort(valid, axis=0, kind="stable")
+    return np.take_along_axis(close, order, axis=0), valid.sum(axis=0)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing `window`-row mean down each column via cumulative sums.
+
+    NaN until a column has `window` values in the window. Values are offset
+    by each column's first value so the running sums stay small.
+    """
+    valid = ~np.isnan(values)
+    first = np.argmax(valid, axis=0)
+    base = np.nan_to_num(values[first, np.arange(values.shape[1])])
+    sums = np.cumsum(np.where(valid, values - base, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[window:] -= sums[:-window].copy()
+    counts[window:] -= counts[:-window].copy()
+    with np.errstate(invalid="ignore"):
+        means = sums / window + base
+    means[counts < window] = np.nan
+    return means
+
+
+def _classify(price: np.ndarray, ma: np.ndarray, ma_prev: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(stage, slope) elementwise; NaN MA or slope falls through like the old code."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(ma_prev == 0, 0.0, (ma - ma_prev) / ma_prev)
+    stage = np.select(
+        [(price > ma) & (slope > SLOPE_THRESHOLD),
+         (price < ma) & (slope < -SLOPE_THRESHOLD),
+         price > ma],
+        [2, 4, 3], default=1,
+    )
+    return stage, slope
+
+
+def compute_stages(close, min_bars: int = MIN_BARS_FULL, window: int = MA_WINDOW,
+                   slope_bars: int = SLOPE_BARS) -> pd.DataFrame:
+    """Stage, MA, slope and price for every column of a close matrix.
+
+    `close` is a (date x ticker) DataFrame or 2-D array (NaN = no bar).
+    Returns a frame indexed by ticker with columns stage (nullable Int64),
+    ma_30_week, slope, price and bars.
+    """
+    tickers = close.columns if isinstance(close, pd.DataFrame) else pd.RangeIndex(np.shape(close)[1])
+    values, counts = _compact(np.asarray(close, dtype="f8"))
+    # Only the last MA and the one slope_bars earlier are needed
+    values = values[-(window + slope_bars):]
+    if not len(values):
+        values = np.full((1, len(tickers)), np.nan)
+
+    ma_series = rolling_mean(values, window)
+    ma = ma_series[-1]
+    ma_prev = ma_series[-1 - slope_bars] if len(ma_series) > slope_bars else np.full(len(tickers), np.nan)
+    price = values[-1]
+
+    stage, slope = _classify(price, ma, ma_prev)
+    enough = (counts >= max(min_bars, window)) & ~np.isnan(ma)
+    stage = pd.array(stage, dtype="Int64")
+    stage[~enough] = pd.NA
+
+    return pd.DataFrame({
+        "stage": stage,
+        "ma_30_week": np.where(enough, ma, np.nan),
+        "slope": np.where(enough, slope, np.nan),
+        "price": price,
+        "bars": counts,
+    }, index=tickers)
+
+
+def stage_matrix(close: pd.DataFrame, min_bars: int = MIN_BARS_FULL, window: int = MA_WINDOW,
+                 slope_bars: int = SLOPE_BARS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Stage on every bar of every ticker, as of that day.
+
+    Returns (stage, ma, dates), all (bar x ticker) with each ticker's bars
+    packed to the bottom like _compact(): stage is int8 with 0 where the
+    ticker had too little history, dates are the bars' dates (NaT above a
+    ticker's first bar). The last row equals compute_stages().
+    """
+    raw = np.asarray(close, dtype="f8")
+    valid = ~np.isnan(raw)
+    order = np.argsort(valid, axis=0, kind="stable")
+    values = np.take_along_axis(raw, order, axis=0)
+    counts = valid.sum(axis=0)
+    rows = len(values)
+
+    dates = close.index.values.astype("datetime64[D]")[order]
+    dates[np.arange(rows)[:, None] < (rows - counts)[None, :]] = np.datetime64("NaT")
+
+    ma = rolling_mean(values, window)
+    ma_prev = np.full_like(ma, np.nan)
+    ma_prev[slope_bars:] = ma[:-slope_bars]
+
+    stage, _ = _classify(values, ma, ma_prev)
+    # Bars the ticker had up to and including each row
+    seen = np.arange(1, rows + 1)[:, None] - (rows - counts)[None, :]
+    enough = (seen >= max(min_bars, window)) & ~np.isnan(ma)
+    return np.where(enough, stage, 0).astype("int8"), ma, dates
+
+
+def stage_of(hist: pd.DataFrame | None, min_bars: int = MIN_BARS_FULL):
+    """(stage, ma_30_week) for one ticker's history frame; (None, None) if too short."""
+    if hist is None or hist.empty:
+        return None, None
+    result = compute_stages(hist[["Close"]], min_bars).iloc[0]
+    return stage_value(result)
+
+
+def stage_value(result) -> tuple:
+    """(stage, ma_30_week) as plain Python values from a compute_stages row."""
+    if pd.isna(result["stage"]):
+        return None, None
+    return int(result["stage"]), float(result["ma_30_week"])
@@ -0,0 +1,218 @@
+"""
+Historical Weinstein stage for every ticker on every trading day.
+
+A batch job reads the full close history from the local OHLCV store,
+STAGE_HISTORY_CHUNK tickers at a time, computes the stage on every bar in
+one vectorized pass (stage_engine.stage_matrix, same rules as the daily
+updaters) and stores it run-length encoded in a local SQLite table: one
+row per run of unchanged stage (ticker, start_date, end_date, stage, bars,
+ma at the start of the run). Query helpers answer "what stage was X in on
+date D" and "when did X enter stage 2" without recomputing any MAs.
+
+Usage:
+    python stage_history.py build                    # every ticker in the OHLCV store
+    python stage_history.py build AAPL MSFT
+    python stage_history.py transitions --ticker AAPL --to 2
+    python stage_history.py transitions --to 2 --since 2024-01-01
+    python stage_history.py on AAPL 2020-03-23
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from local_cache import cache_path
+from stage_engine import MIN_BARS_FULL, stage_matrix
+
+STAGE_HISTORY_CHUNK = int(os.getenv("STAGE_HISTORY_CHUNK") or 500)
+
+
+def encode_runs(tickers: list[str], stage: np.ndarray, ma: np.ndarray, dates: np.ndarray) -> list[tuple]:
+    """Run-length encode a stage_matrix() result.
+
+    Returns (ticker, start_date, end_date, stage, bars, ma) tuples; bars
+    without a stage (too little history) are not stored.
+    """
+    rows = len(stage)
+    if not rows:
+        return []
+    change = np.ones(stage.shape, dtype=bool)
+    change[1:] = stage[1:] != stage[:-1]
+
+    # Column-major, so runs come out grouped by ticker and in date order
+    cols, starts = np.nonzero(change.T)
+    ends = np.full(len(starts), rows - 1)
+    same = cols[1:] == cols[:-1]
+    ends[:-1][same] = starts[1:][same] - 1
+
+    values = stage[starts, cols]
+    keep = values != 0
+    cols, starts, ends, values = cols[keep], starts[keep], ends[keep], values[keep]
+
+    return list(zip(
+        np.asarray(tickers, dtype=object)[cols].tolist(),
+        dates[starts, cols].astype(str).tolist(),
+        dates[ends, cols].astype(str).tolist(),
+        values.tolist(),
+        (ends - starts + 1).tolist(),
+        np.round(ma[starts, cols], 4).tolist(),
+    ))
+
+
+class StageHistory:
+    """SQLite table of stage runs with transition queries."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or cache_path("stage_history.db")
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stage_runs (
+                ticker TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                stage INTEGER NOT NULL,
+                bars INTEGER NOT NULL,
+                ma REAL,
+                PRIMARY KEY (ticker, start_date)
+            ) WITHOUT ROWID
+        """)
+        # "Who entered stage N since D" without a full scan
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stage_runs_stage_start ON stage_runs (stage, start_date)"
+        )
+        self._conn.commit()
+
+    def replace_runs(self, tickers: list[str], runs: list[tuple]):
+        """Replace every stored run of `tickers` in one transaction."""
+        with self._conn:
+            self._conn.executemany("DELETE FROM stage_runs WHERE ticker = ?", [(t,) for t in tickers])
+            self._conn.executemany(
+                "INSERT INTO stage_runs (ticker, start_date, end_date, stage, bars, ma) "
+                "VALUES (?, ?, ?, ?, ?, ?)", runs
+            )
+
+    def runs(self, ticker: str) -> list[dict]:
+        cur = self._conn.execute(
+            "SELECT start_date, end_date, stage, bars, ma FROM stage_runs "
+            "WHERE ticker = ? ORDER BY start_date", (ticker,)
+        )
+        return [dict(zip(("start_date", "end_date", "stage", "bars", "ma"), row)) for row in cur]
+
+    def stage_on(self, ticker: str, day: str) -> dict | None:
+        """The run covering `day` (YYYY-MM-DD), or None if no stage is known."""
+        row = self._conn.execute(
+            "SELECT start_date, end_date, stage, bars, ma FROM stage_runs "
+            "WHERE ticker = ? AND start_date <= ? ORDER BY start_date DESC LIMIT 1",
+            (ticker, day)
+        ).fetchone()
+        if not row or row[1] < day:
+            return None
+        return dict(zip(("start_date", "end_date", "stage", "bars", "ma"), row))
+
+    def transitions(self, ticker: str | None = None, to_stage: int | None = None,
+                    since: str | None = None, until: str | None = None) -> list[dict]:
+        """Stage changes (date, ticker, from_stage, to_stage, ma), oldest first.
+
+        The first run of a ticker is reported with from_stage None.
+        """
+        where, params = [], []
+        if ticker:
+            where.append("ticker = ?")
+            params.append(ticker)
+        if to_stage is not None:
+            where.append("stage = ?")
+            params.append(to_stage)
+        if since:
+            where.append("start_date >= ?")
+            params.append(since)
+        if until:
+            where.append("start_date <= ?")
+            params.append(until)
+
+        # LAG over the ticker's runs gives the stage it left; filter after the window
+        cur = self._conn.execute(f"""
+            SELECT start_date, ticker, from_stage, stage, ma FROM (
+                SELECT ticker, start_date, stage, ma,
+                       LAG(stage) OVER (PARTITION BY ticker ORDER BY start_date) AS from_stage
+                FROM stage_runs
+                {"WHERE ticker = ?" if ticker else ""}
+            )
+            {("WHERE " + " AND ".join(where)) if where else ""}
+            ORDER BY start_date, ticker
+        """, ([ticker] if ticker else []) + params)
+        return [dict(zip(("date", "ticker", "from_stage", "to_stage", "ma"), row)) for row in cur]
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM stage_runs").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def build_stage_history(tickers: list[str] | None = None, store=None, history: StageHistory | None = None,
+                        min_bars: int = MIN_BARS_FULL, chunk: int = STAGE_HISTORY_CHUNK) -> dict:
+    """Recompute and store the stage runs of `tickers` (default: the whole store)."""
+    from ohlcv_store import OHLCVStore
+
+    store = store or OHLCVStore()
+    history = history or StageHistory()
+    tickers = tickers or store.tickers()
+    stats = {"tickers": 0, "bars": 0, "runs": 0}
+
+    started = time.perf_counter()
+    for i in range(0, len(tickers), chunk):
+        group = tickers[i:i + chunk]
+        close = store.frame(group, "close")
+        stage, ma, dates = stage_matrix(close, min_bars)
+        runs = encode_runs(group, stage, ma, dates)
+        history.replace_runs(group, runs)
+
+        stats["tickers"] += len(group)
+        stats["bars"] += int((stage != 0).sum())
+        stats["runs"] += len(runs)
+        print(f"[INFO] Stage history: {stats['tickers']}/{len(tickers)} tickers, "
+              f"{stats['runs']} runs ({time.perf_counter() - started:.1f}s)")
+
+    ratio = stats["bars"] / stats["runs"] if stats["runs"] else 0
+    print(f"[INFO] Stage history built: {stats['bars']} staged bars stored as {stats['runs']} runs "
+          f"({ratio:.1f} bars/run) in {time.perf_counter() - started:.1f}s")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historical Weinstein stage runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="recompute stage runs from the OHLCV store")
+    build.add_argument("tickers", nargs="*")
+    build.add_argument("--min-bars", type=int, default=MIN_BARS_FULL)
+
+    trans = sub.add_parser("transitions", help="list stage changes")
+    trans.add_argument("--ticker")
+    trans.add_argument("--to", type=int, choices=(1, 2, 3, 4), dest="to_stage")
+    trans.add_argument("--since")
+    trans.add_argument("--until")
+
+    on = sub.add_parser("on", help="stage of a ticker on a date")
+    on.add_argument("ticker")
+    on.add_argument("date")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_stage_history(args.tickers or None, min_bars=args.min_bars)
+    elif args.command == "transitions":
+        for t in StageHistory().transitions(args.ticker, args.to_stage, args.since, args.until):
+            print(f"{t['date']}  {t['ticker']:<6} {t['from_stage'] or '-'} -> {t['to_stage']}  "
+                  f"(MA {t['ma']})")
+    else:
+        run = StageHistory().stage_on(args.ticker, args.date)
+        if run:
+            print(f"{args.ticker} on {args.date}: stage {run['stage']} "
+                  f"({run['start_date']} to {run['end_date']})")
+        else:
+            print(f"{args.ticker} on {args.date}: no stage")
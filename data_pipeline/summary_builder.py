@@ -0,0 +1,119 @@
+"""
+Client-side insider_summary builder.
+
+Streams every insider_transactions row in the window with keyset pagination
+(PostgREST silently caps an unpaged select at 1000 rows), aggregates all
+tickers in one pandas groupby and writes the summaries back in one bulk
+upsert. Same measures as refresh_insider_summary in
+database_schema_insider_functions.sql, for databases without that function.
+
+Usage:
+    python summary_builder.py                    # summed shares (update_summary rules)
+    python summary_builder.py --measure value --threshold 1000000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from supabase_client import get_client, iter_rows
+
+MEASURES = ("shares", "count", "value")
+
+
+def iter_window_rows(days: int = 90, columns: str = "ticker, transaction_type, shares, total_value",
+                     tickers: list[str] | None = None):
+    """Yield insider_transactions rows with transaction_date in the window."""
+    cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+    def where(q):
+        q = q.gte("transaction_date", cutoff)
+        return q.in_("ticker", tickers) if tickers else q
+
+    return iter_rows("insider_transactions", columns, where=where)
+
+
+def aggregate(rows, measure: str = "shares", verdict_threshold: float = 0) -> pd.DataFrame:
+    """Per-ticker summary columns from transaction rows (one groupby)."""
+    if measure not in MEASURES:
+        raise ValueError(f"Unknown measure {measure!r}, expected one of {MEASURES}")
+
+    df = pd.DataFrame(rows, columns=["ticker", "transaction_type", "shares", "total_value"])
+    if df.empty:
+        return pd.DataFrame(columns=["ticker", "buys_90d", "sells_90d", "total_bought_value_90d",
+                                     "total_sold_value_90d", "net_activity_90d", "verdict"])
+
+    is_buy = (df["transaction_type"] == "buy").to_numpy()
+    is_sell = (df["transaction_type"] == "sell").to_numpy()
+    amount = (pd.to_numeric(df["shares"]).fillna(0).to_numpy() if measure == "shares"
+              else np.ones(len(df)))
+    value = pd.to_numeric(df["total_value"]).fillna(0).to_numpy()
+
+    parts = pd.DataFrame({
+        "ticker": df["ticker"],
+        "buys_90d": np.where(is_buy, amount, 0),
+        "sells_90d": np.where(is_sell, amount, 0),
+        "total_bought_value_90d": np.where(is_buy, value, 0),
+        "total_sold_value_90d": np.where(is_sell, value, 0),
+    })
+    summary = parts.groupby("ticker", sort=True).sum().reset_index()
+
+    if measure == "value":
+        net = summary["total_bought_value_90d"] - summary["total_sold_value_90d"]
+    else:
+        net = summary["buys_90d"] - summary["sells_90d"]
+    summary["net_activity_90d"] = net
+    summary["verdict"] = np.select(
+        [net > verdict_threshold, net < -verdict_threshold],
+        ["accumulating", "distributing"], default="neutral"
+    )
+    summary[["buys_90d", "sells_90d"]] = summary[["buys_90d", "sells_90d"]].astype("int64")
+    return summary
+
+
+def build_summaries(days: int = 90, measure: str = "shares", verdict_threshold: float = 0,
+                    tickers: list[str] | None = None) -> int:
+    """Rebuild insider_summary for every ticker with trades in the window.
+
+    With `tickers` only those are rebuilt, and any of them that already has
+    a summary row but no trades left in the window is zeroed, like
+    refresh_insider_summary's p_tickers. Returns the number of summary rows
+    written.
+    """
+    started = time.perf_counter()
+    rows = list(iter_window_rows(days, tickers=tickers))
+    summary = aggregate(rows, measure, verdict_threshold)
+    missing = [t for t in tickers or [] if t not in set(summary["ticker"])]
+    if missing:
+        stale = get_client().table("insider_summary").select("ticker").in_("ticker", missing).execute()
+        zero = aggregate([{"ticker": r["ticker"], "transaction_type": None, "shares": 0, "total_value": 0}
+                          for r in stale.data or []], measure, verdict_threshold)
+        summary = pd.concat([summary, zero], ignore_index=True)
+    if summary.empty:
+        print(f"[INFO] No insider transactions in the last {days} days")
+        return 0
+
+    summary["summary_measure"] = measure
+    summary["updated_at"] = datetime.utcnow().isoformat()
+    records = [
+        {k: (v.item() if isinstance(v, np.generic) else v) for k, v in rec.items()}
+        for rec in summary.to_dict("records")
+    ]
+    get_client().table("insider_summary").upsert(records, on_conflict="ticker").execute()
+
+    print(f"[INFO] Summaries for {len(records)} tickers from {len(rows)} trades "
+          f"in {time.perf_counter() - started:.1f}s")
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild insider_summary client-side")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--measure", choices=MEASURES, default="shares")
+    parser.add_argument("--threshold", type=float, default=0, help="verdict threshold on net activity")
+    args = parser.parse_args()
+
+    build_summaries(args.days, args.measure, args.threshold)
@@ -3,88 +3,249 @@ Supabase client and helper functions for insider transactions.
 """
 
 import os
-from supabase import create_client
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from db_writer import BatchWriter
 
 load_dotenv()
 
-supabase = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_KEY")
-)
+_client = None
+_client_lock = threading.Lock()
 
 
-def save_trades(trades: list[dict]):
-    """Upsert trades into insider_transactions table."""
-    if not trades:
-        return
-    
-    for trade in trades:
-        try:
-            supabase.table("insider_transactions").upsert(
-                trade,
-                on_conflict="ticker,insider_name,transaction_date,transaction_type,shares"
-            ).execute()
-        except Exception as e:
-            print(f"[WARN] Failed to save trade {trade.get('ticker', '?')}: {e}")
+def get_client():
+    """Shared Supabase client, created on first use.
 
+    supabase-py (and its httpx/pydantic stack) is only imported here, so
+    scripts that never touch the database start without paying for it.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import create_client
 
-def update_summary(ticker: str, days: int = 90):
-    """Update insider_summary table for a specific ticker."""
-    cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
-    
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv("SUPABASE_SERVICE_KEY")
+                if not url or not key:
+                    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
+                _client = create_client(url, key)
+    return _client
+
+
+def __getattr__(name):
+    # `from supabase_client import supabase` still works, lazily
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Columns of the insider_transactions_unique constraint
+TRADE_KEY = ("ticker", "insider_name", "transaction_date", "transaction_type", "shares")
+TRADE_CONFLICT = ",".join(TRADE_KEY)
+
+# Rows per upsert request
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE") or 500)
+
+# Rows per page for streamed reads (PostgREST's default max-rows is 1000)
+READ_PAGE_SIZE = int(os.getenv("READ_PAGE_SIZE") or 1000)
+
+
+def _pg_value(value) -> str:
+    """Quote a value for a PostgREST logic-tree filter."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _after_key(key: tuple, last: dict) -> str:
+    """PostgREST or=(...) filter for rows whose key sorts after `last`.
+
+    For key (a, b, c): a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z).
+    """
+    terms = []
+    for i, col in enumerate(key):
+        conds = [f"{k}.eq.{_pg_value(last[k])}" for k in key[:i]]
+        conds.append(f"{col}.gt.{_pg_value(last[col])}")
+        terms.append(conds[0] if len(conds) == 1 else f"and({','.join(conds)})")
+    return ",".join(terms)
+
+
+def iter_pages(table: str, columns: str = "*", key: tuple = ("id",), where=None,
+               page_size: int = READ_PAGE_SIZE, client=None, prefetch: bool = True):
+    """Yield pages (lists of rows) of a table, keyset-paginated on `key`.
+
+    `key` must be unique (add "id" as a tie-breaker to e.g. (ticker,
+    transaction_date)); its columns are always selected. `where(query)`
+    adds filters to every page query. While the caller handles a page the
+    next one is already being fetched on a background thread.
+    """
+    client = client or get_client()
+    if columns != "*":
+        selected = [c.strip() for c in columns.split(",")]
+        columns = ", ".join(selected + [k for k in key if k not in selected])
+
+    def fetch(last):
+        query = client.table(table).select(columns)
+        if where is not None:
+            query = where(query)
+        if last is not None:
+            query = query.or_(_after_key(key, last))
+        for col in key:
+            query = query.order(col)
+        return query.limit(page_size).execute().data or []
+
+    pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        page = fetch(None)
+        while page:
+            last = page[-1]
+            upcoming = pool.submit(fetch, last) if pool else None
+            yield page
+            # A short page may just be the server's row cap: stop on an empty one
+            page = upcoming.result() if upcoming else fetch(last)
+    finally:
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_rows(table: str, columns: str = "*", key: tuple = ("id",), where=None,
+              page_size: int = READ_PAGE_SIZE, client=None, prefetch: bool = True):
+    """Yield rows one by one; see iter_pages."""
+    for page in iter_pages(table, columns, key, where, page_size, client, prefetch):
+        yield from page
+
+
+def iter_column_batches(table: str, columns: str, key: tuple = ("id",), where=None,
+                        page_size: int = READ_PAGE_SIZE, client=None, prefetch: bool = True):
+    """Yield one {column: [values]} dict per page; see iter_pages."""
+    for page in iter_pages(table, columns, key, where, page_size, client, prefetch):
+        yield {col: [row.get(col) for row in page] for col in page[0]}
+
+
+def trade_key(trade: dict) -> tuple:
+    return tuple(trade.get(col) for col in TRADE_KEY)
+
+
+def dedupe_trades(trades: list[dict]) -> list[dict]:
+    """Drop rows sharing an insider_transactions_unique key (the last one wins).
+
+    Postgres rejects a whole upsert statement that touches the same key twice.
+    """
+    return list({trade_key(t): t for t in trades}.values())
+
+
+def _upsert_chunk(rows: list[dict], inserted: list | None, failed: list | None) -> int:
+    """Upsert one chunk; on failure bisect until the bad rows are isolated."""
     try:
-        res = supabase.table("insider_transactions") \
-            .select("*") \
-            .eq("ticker", ticker) \
-            .gte("transaction_date", cutoff) \
-            .execute()
-        rows = res.data or []
+        res = get_client().table("insider_transactions").upsert(
+            rows, on_conflict=TRADE_CONFLICT, ignore_duplicates=inserted is not None
+        ).execute()
+        if inserted is None:
+            return len(rows)
+        # With ON CONFLICT DO NOTHING only the new rows come back
+        inserted.extend(res.data or [])
+        return len(res.data or [])
     except Exception as e:
-        print(f"[ERROR] Failed to load transactions for {ticker}: {e}")
-        return
-    
-    buys = sum(r.get("shares", 0) for r in rows if r.get("transaction_type") == "buy")
-    sells = sum(r.get("shares", 0) for r in rows if r.get("transaction_type") == "sell")
-    net = buys - sells
-    
-    verdict = "neutral"
-    if net > 0:
-        verdict = "accumulating"
-    elif net < 0:
-        verdict = "distributing"
-    
+        if len(rows) == 1:
+            print(f"[WARN] Failed to save trade {rows[0].get('ticker', '?')}: {e}")
+            if failed is not None:
+                failed.extend(rows)
+            return 0
+    mid = len(rows) // 2
+    return _upsert_chunk(rows[:mid], inserted, failed) + _upsert_chunk(rows[mid:], inserted, failed)
+
+
+def save_trades(trades: list[dict], chunk_size: int = UPSERT_CHUNK_SIZE,
+                inserted: list | None = None, failed: list | None = None) -> int:
+    """Upsert trades into insider_transactions table in chunks.
+
+    If `inserted` is given, rows that already exist are left untouched
+    (ON CONFLICT DO NOTHING) and the newly inserted rows are appended to it,
+    which is what incremental_summary needs. Rows that could not be
+    written are appended to `failed` if given.
+    Returns the number of rows written.
+    """
+    if not trades:
+        return 0
+
+    rows = dedupe_trades(trades)
+    written = 0
+    for i in range(0, len(rows), chunk_size):
+        written += _upsert_chunk(rows[i:i + chunk_size], inserted, failed)
+    return written
+
+
+def trade_writer(inserted: list | None = None, **kwargs) -> BatchWriter:
+    """Write-behind writer for insider_transactions rows, backed by save_trades."""
+    def write(rows):
+        failed = []
+        save_trades(rows, inserted=inserted, failed=failed)
+        return failed
+    return BatchWriter("insider_transactions", write, key=trade_key, **kwargs)
+
+
+def upsert_trades_counted(trades: list[dict], failed: list | None = None) -> tuple[int, int]:
+    """Upsert a batch in one set-based statement. Returns (inserted, updated).
+
+    Uses the upsert_insider_transactions function from
+    database_schema_insider_functions.sql. If it is not installed, falls back
+    to a plain chunked upsert, which cannot tell inserts from updates
+    (everything written is reported as updated). Rows that could not be
+    written are appended to `failed` if given, as in save_trades.
+    """
+    if not trades:
+        return 0, 0
+
+    rows = dedupe_trades(trades)
     try:
-        supabase.table("insider_summary").upsert({
-            "ticker": ticker,
-            "buys_90d": buys,
-            "sells_90d": sells,
-            "net_activity_90d": net,
-            "verdict": verdict,
-            "updated_at": datetime.utcnow().isoformat()
-        }, on_conflict="ticker").execute()
+        res = get_client().rpc("upsert_insider_transactions", {"p_rows": rows}).execute()
+        counts = (res.data or [{}])[0]
+        return counts.get("inserted", 0), counts.get("updated", 0)
     except Exception as e:
-        print(f"[WARN] Failed to update summary for {ticker}: {e}")
+        print(f"[WARN] upsert_insider_transactions RPC failed ({e}), using plain upsert")
+    return 0, save_trades(rows, failed=failed)
 
 
-def rebuild_all_summaries(days: int = 90):
-    """Rebuild insider_summary for all tickers with transactions."""
-    cutoff = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
-    
+def refresh_summaries(days: int = 90, measure: str = "shares", verdict_threshold: float = 0,
+                      all_tickers: bool = False, tickers: list[str] | None = None) -> int | None:
+    """Recompute insider_summary server-side in one call.
+
+    Runs the refresh_insider_summary function from
+    database_schema_insider_functions.sql. `measure` selects what buys/sells
+    hold ("shares", "count" or "value"); see the function for details.
+    Returns the number of summary rows written, or None on failure.
+    """
+    params = {
+        "p_days": days,
+        "p_measure": measure,
+        "p_verdict_threshold": verdict_threshold,
+        "p_all_tickers": all_tickers,
+        "p_tickers": tickers,
+    }
     try:
-        # Get all unique tickers with transactions in the last 90 days
-        res = supabase.table("insider_transactions") \
-            .select("ticker") \
-            .gte("transaction_date", cutoff) \
-            .execute()
-        
-        tickers = list(set([r["ticker"] for r in res.data or []]))
-        
-        for ticker in tickers:
-            update_summary(ticker, days)
-        
-        print(f"[INFO] Updated summaries for {len(tickers)} tickers")
+        return get_client().rpc("refresh_insider_summary", params).execute().data
     except Exception as e:
-        print(f"[ERROR] Failed to rebuild summaries: {e}")
+        print(f"[ERROR] refresh_insider_summary failed (is database_schema_insider_functions.sql installed?): {e}")
+        return None
+
 
+def update_summary(ticker: str, days: int = 90):
+    """Update insider_summary table for a specific ticker.
+
+    The ticker is written even without trades in the window (zero row).
+    """
+    if refresh_summaries(days, measure="shares", tickers=[ticker]) is None:
+        # SQL function not installed: aggregate this ticker client-side
+        from summary_builder import build_summaries
+        build_summaries(days, measure="shares", tickers=[ticker])
+
+
+def rebuild_all_summaries(days: int = 90):
+    """Rebuild insider_summary for all tickers with transactions."""
+    updated = refresh_summaries(days, measure="shares")
+    if updated is None:
+        # SQL function not installed: page the window and aggregate client-side
+        from summary_builder import build_summaries
+        updated = build_summaries(days, measure="shares")
+    print(f"[INFO] Updated summaries for {updated} tickers")
@@ -12,15 +12,17 @@ Uses EDGAR on-demand + Yahoo yfinance.
 You only need to schedule THIS file in Task Scheduler.
 """
 
+import argparse
 import os
-import time
-from datetime import datetime, timedelta
-from supabase import create_client
+from datetime import datetime
 from dotenv import load_dotenv
-import yfinance as yf
-import feedparser
-import pandas as pd
-import requests
+import http_transport
+from db_writer import upsert_changed
+from local_cache import FingerprintCache
+from supabase_client import get_client, refresh_summaries, iter_rows
+
+# yfinance/pandas (via price_history) and feedparser are imported by the
+# stages that use them, so an insider-only run skips the stock stack at startup
 
 # -----------------------
 # ENV + SUPABASE SETUP
@@ -43,11 +45,6 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     print(f"DEBUG: SUPABASE_URL: {SUPABASE_URL}")
     print(f"DEBUG: SUPABASE_SERVICE_KEY: {'Set' if SUPABASE_SERVICE_KEY else 'None'}")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # -----------------------
 # HELPER FUNCTIONS
 # -----------------------
@@ -59,50 +56,31 @@ def log(msg):
 # STOCK UPDATE LOGIC
 # -----------------------
 
-def calculate_stage(hist):
-    """Weinstein Stage Calculation"""
-    try:
-        hist = hist.dropna()
-
-        if len(hist) < 150:
-            return None, None
-
-        hist['MA30W'] = hist['Close'].rolling(window=150).mean()
-        ma_current = hist['MA30W'].iloc[-1]
-
-        current_price = hist['Close'].iloc[-1]
-        prev_ma = hist['MA30W'].iloc[-30]
-
-        slope = (ma_current - prev_ma) / prev_ma if prev_ma else 0
-
-        if current_price > ma_current and slope > 0.02:
-            return 2, float(ma_current)
-        if current_price < ma_current and slope < -0.02:
-            return 4, float(ma_current)
-        if current_price > ma_current:
-            return 3, float(ma_current)
-        return 1, float(ma_current)
-
-    except:
-        return None, None
-
+def update_stock(ticker, hist=None, stage=None, fingerprints=None):
+    """Update one stock with latest info (hist/stage/fingerprints: from the batched run)
 
-def update_stock(ticker):
-    """Update one stock with latest info"""
+    Writes go through the same "stocks" FingerprintCache as update_stocks, so
+    the other updaters' hashes stay in step with what is stored.
+    """
+    standalone = fingerprints is None
+    if standalone:
+        fingerprints = FingerprintCache("stocks")
     try:
         log(f"Updating {ticker}")
 
-        # Fix ticker format for yfinance (BRK.B -> BRK-B)
-        yf_ticker = ticker.replace('.', '-')
-        stock = yf.Ticker(yf_ticker)
-        info = stock.info
-        hist = stock.history(period="1y")
+        from price_history import download_history, ticker_info
+        from stage_engine import MIN_BARS_MA, stage_of
+
+        # One quoteSummary request per ticker, paced by the shared Yahoo bucket
+        info = ticker_info(ticker)
+        if hist is None:
+            hist = download_history([ticker], period="1y").history(ticker)
 
         if hist.empty:
             log(f"[WARN] No price history for {ticker}")
             return False
 
-        stage, ma_30w = calculate_stage(hist)
+        stage, ma_30w = stage if stage is not None else stage_of(hist, MIN_BARS_MA)
 
         data = {
             "ticker": ticker,
@@ -119,7 +97,11 @@ def update_stock(ticker):
             "updated_at": datetime.utcnow().isoformat(),
         }
 
-        supabase.table("stocks").upsert(data, on_conflict="ticker").execute()
+        if upsert_changed(get_client(), "stocks", [data], "ticker", fingerprints):
+            log(f"❌ Stock update error {ticker}: write failed")
+            return False
+        if standalone:
+            fingerprints.save()
         return True
 
     except Exception as e:
@@ -129,21 +111,28 @@ def update_stock(ticker):
 
 def update_all_stocks():
     """Fetch list from 'tickers' table and update all"""
-    log("Fetching active ticker list...")
+    from price_history import download_history
+    from stage_engine import MIN_BARS_MA, compute_stages, stage_value
 
-    resp = supabase.table("tickers").select("ticker").execute()
+    log("Fetching active ticker list...")
 
-    tickers = [row["ticker"] for row in resp.data]
+    tickers = [row["ticker"] for row in iter_rows("tickers", "ticker", key=("ticker",))]
 
     log(f"Total tickers to update: {len(tickers)}")
 
+    # Price history for every ticker in a few multi-symbol requests
+    prices = download_history(tickers, period="1y")
+    stages = compute_stages(prices.close, MIN_BARS_MA)
+
+    fingerprints = FingerprintCache("stocks")
     success = 0
 
     for t in tickers:
-        if update_stock(t):
+        if update_stock(t, prices.history(t), stage_value(stages.loc[t]), fingerprints):
             success += 1
-        time.sleep(1.2)  # prevent rate limiting
 
+    fingerprints.save()
+    fingerprints.print_stats("stocks")
     log(f"STOCK UPDATE DONE: {success}/{len(tickers)} success")
 
 
@@ -156,10 +145,10 @@ SEC_RSS_URL = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=4
 
 def fetch_rss():
     """Fetch RSS with correct SEC headers (important)"""
-    headers = {
-        "User-Agent": "SilentWhaleApp/1.0 (contact: your-email@example.com)"
-    }
-    response = requests.get(SEC_RSS_URL, headers=headers)
+    import feedparser
+
+    # SEC User-Agent is set per host by http_transport
+    response = http_transport.get(SEC_RSS_URL, timeout=30)
     return feedparser.parse(response.text)
 
 
@@ -184,7 +173,7 @@ def update_insiders():
             continue  # skip garbage symbols
 
         # Check if ticker exists in our DB
-        exists = supabase.table("tickers").select("ticker").eq("ticker", ticker).execute()
+        exists = get_client().table("tickers").select("ticker").eq("ticker", ticker).execute()
         if not exists.data:
             continue
 
@@ -192,7 +181,7 @@ def update_insiders():
         transaction_type = "sell" if "sale" in summary.lower() else "buy"
 
         # Insert
-        supabase.table("insider_transactions").insert({
+        get_client().table("insider_transactions").insert({
             "ticker": ticker,
             "insider_name": entry.get("author", "Unknown"),
             "transaction_date": datetime.utcnow().date().isoformat(),
@@ -212,34 +201,8 @@ def update_insider_summary():
     """Summarize last 90 days of insider activity"""
     log("Calculating insider summary...")
 
-    # Get all tickers
-    resp = supabase.table("tickers").select("ticker").execute()
-    tickers = [t["ticker"] for t in resp.data]
-
-    # Calculate 90 days ago
-    cutoff_date = (datetime.utcnow() - timedelta(days=90)).date().isoformat()
-
-    for t in tickers:
-        tx = supabase.table("insider_transactions") \
-            .select("*") \
-            .eq("ticker", t) \
-            .gte("transaction_date", cutoff_date) \
-            .execute()
-
-        buys = sum(1 for x in tx.data if x["transaction_type"] == "buy")
-        sells = sum(1 for x in tx.data if x["transaction_type"] == "sell")
-        net = buys - sells
-
-        verdict = "accumulating" if net > 0 else "distributing" if net < 0 else "neutral"
-
-        supabase.table("insider_summary").upsert({
-            "ticker": t,
-            "buys_90d": buys,
-            "sells_90d": sells,
-            "net_activity_90d": net,
-            "verdict": verdict,
-            "updated_at": datetime.utcnow().isoformat()
-        }, on_conflict="ticker").execute()
+    # Trade counts for every tracked ticker, computed server-side in one call
+    refresh_summaries(90, measure="count", all_tickers=True)
 
     log("INSIDER SUMMARY UPDATED")
 
@@ -248,12 +211,23 @@ def update_insider_summary():
 # MAIN EXECUTION
 # -----------------------
 
+STAGES = {
+    "stocks": update_all_stocks,
+    "insiders": update_insiders,
+    "summary": update_insider_summary,
+}
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combined daily updater")
+    parser.add_argument("--only", action="append", choices=list(STAGES), metavar="STAGE",
+                        help=f"run only this stage (repeatable; one of {', '.join(STAGES)})")
+    args = parser.parse_args()
+
     log("=== SILENT WHALE DAILY UPDATE START ===")
 
-    update_all_stocks()
-    update_insiders()
-    update_insider_summary()
+    for stage in args.only or STAGES:
+        STAGES[stage]()
 
     log("=== ALL UPDATES COMPLETE ===")
 
@@ -8,31 +8,19 @@ Daily insider transaction updater
 """
 
 import feedparser
-import requests
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-from supabase import create_client
-import os
+from datetime import datetime
 from dotenv import load_dotenv
+import http_transport
+from supabase_client import refresh_summaries, trade_writer
+from known_trades import KnownTradeIndex
+from prune_insiders import prune_old_trades
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # RSS feed (latest Form-4 filings)
 RSS_URL = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=4&owner=only&count=2000&output=atom"
 
-# SEC requires proper User-Agent header
-RSS_HEADERS = {
-    "User-Agent": "Mozilla/5.0 (SilentWhale; +contact@example.com)"
-}
-
 # Track same tickers as update_stocks.py
 TRACKED_TICKERS = set([
     'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B',
@@ -65,9 +53,8 @@ def download_xml(entry):
         return None
 
     try:
-        # SEC requires a user-agent
-        headers = {"User-Agent": "Mozilla/5.0 (compatible; SilentWhale/1.0; +https://silentwhale.com)"}
-        r = requests.get(link, headers=headers, timeout=10)
+        # SEC requires a user-agent (set per host by http_transport)
+        r = http_transport.get(link, timeout=10)
         if r.status_code == 200:
             return r.text
     except Exception as e:
@@ -183,9 +170,9 @@ def parse_form4(xml_text):
     return results
 
 
-def insert_to_supabase(ticker, items):
-    """Insert parsed insider trades to Supabase."""
-    inserted_count = 0
+def insert_to_supabase(ticker, items, writer, known):
+    """Queue parsed insider trades that are not stored yet for insertion."""
+    rows = []
     
     for item in items:
         # Calculate total value if we have price
@@ -205,94 +192,23 @@ def insert_to_supabase(ticker, items):
             "filing_date": item["filing_date"]
         }
 
-        try:
-            # Insert (will handle duplicates via unique constraint or manual check)
-            result = supabase.table("insider_transactions").insert(data).execute()
-            if result.data:
-                inserted_count += 1
-        except Exception as e:
-            # If duplicate, skip
-            if "duplicate" not in str(e).lower() and "unique" not in str(e).lower():
-                print(f"Error inserting transaction: {e}")
+        rows.append(data)
     
-    return inserted_count
+    rows = known.filter_new(rows)
+    writer.put_many(rows)
+    return len(rows)
 
 
 def update_insider_summary():
-    """Update aggregated insider summary table."""
-    # Get all unique tickers with insider transactions
-    cutoff_date = (datetime.utcnow() - timedelta(days=90)).date().isoformat()
-    
-    # Query transactions from last 90 days
-    result = supabase.table("insider_transactions")\
-        .select("ticker, transaction_type, total_value")\
-        .gte("transaction_date", cutoff_date)\
-        .execute()
-    
-    if not result.data:
-        return
-    
-    # Group by ticker
-    ticker_data = {}
-    for trans in result.data:
-        ticker = trans["ticker"]
-        if ticker not in ticker_data:
-            ticker_data[ticker] = {
-                "buys_90d": 0,
-                "sells_90d": 0,
-                "total_bought_value_90d": 0,
-                "total_sold_value_90d": 0
-            }
-        
-        if trans["transaction_type"] == "buy":
-            ticker_data[ticker]["buys_90d"] += 1
-            if trans["total_value"]:
-                ticker_data[ticker]["total_bought_value_90d"] += trans["total_value"]
-        else:
-            ticker_data[ticker]["sells_90d"] += 1
-            if trans["total_value"]:
-                ticker_data[ticker]["total_sold_value_90d"] += trans["total_value"]
-    
-    # Update summary table
-    for ticker, data in ticker_data.items():
-        net_activity = data["total_bought_value_90d"] - data["total_sold_value_90d"]
-        
-        # Determine verdict
-        if net_activity > 1000000:  # $1M threshold
-            verdict = "accumulating"
-        elif net_activity < -1000000:
-            verdict = "distributing"
-        else:
-            verdict = "neutral"
-        
-        summary_data = {
-            "ticker": ticker,
-            "buys_90d": data["buys_90d"],
-            "sells_90d": data["sells_90d"],
-            "total_bought_value_90d": data["total_bought_value_90d"],
-            "total_sold_value_90d": data["total_sold_value_90d"],
-            "net_activity_90d": net_activity,
-            "verdict": verdict,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        try:
-            supabase.table("insider_summary").upsert(summary_data, on_conflict="ticker").execute()
-        except Exception as e:
-            print(f"Error updating summary for {ticker}: {e}")
+    """Update aggregated insider summary table (one server-side call)."""
+    # Verdict needs a $1M net bought/sold value
+    refresh_summaries(90, measure="value", verdict_threshold=1000000)
 
 
 def prune_old_data():
-    """Delete insider data older than 120 days."""
-    cutoff = (datetime.utcnow() - timedelta(days=120)).date().isoformat()
-    
+    """Delete insider data older than 120 days (in bounded batches)."""
     try:
-        # Delete old transactions
-        result = supabase.table("insider_transactions")\
-            .delete()\
-            .lt("transaction_date", cutoff)\
-            .execute()
-        print(f"Pruned old insider transactions before {cutoff}")
+        prune_old_trades(120)
     except Exception as e:
         print(f"Error pruning old data: {e}")
 
@@ -302,7 +218,7 @@ def main():
     
     try:
         print("Fetching SEC RSS feed...")
-        response = requests.get(RSS_URL, headers=RSS_HEADERS, timeout=10)
+        response = http_transport.get(RSS_URL, timeout=10)
         feed = feedparser.parse(response.text)
         
         print(f"Entries: {len(feed.entries)}")
@@ -312,7 +228,10 @@ def main():
             return
         
         processed_count = 0
-        inserted_total = 0
+        queued_total = 0
+        inserted = []
+        known = KnownTradeIndex()
+        writer = trade_writer(inserted=inserted)
         
         for entry in feed.entries:
             ticker = extract_ticker(entry)
@@ -339,12 +258,17 @@ def main():
             if not items:
                 continue
 
-            inserted = insert_to_supabase(ticker, items)
-            inserted_total += inserted
+            queued = insert_to_supabase(ticker, items, writer, known)
+            queued_total += queued
             processed_count += 1
-            print(f"  ✓ {ticker}: {inserted} transactions inserted")
-
-        print(f"\nProcessed {processed_count} tickers, {inserted_total} total transactions inserted")
+            print(f"  ✓ {ticker}: {queued} transactions queued")
+
+        writer.close()
+        known.print_stats()
+        writer.print_stats()
+        print(f"\nProcessed {processed_count} tickers, {len(inserted)} new transactions inserted "
+              f"({queued_total} queued, {known.stats['filtered']} already stored)")
+        http_transport.print_transport_stats()
         
         # Update summary table
         print("Updating insider summary...")
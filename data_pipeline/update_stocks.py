@@ -11,88 +11,41 @@ from datetime import datetime
 import pandas as pd
 import yfinance as yf
 from dotenv import load_dotenv
-from supabase import create_client
+from supabase_client import get_client, iter_rows
+from db_writer import BatchWriter, upsert_changed
+from local_cache import FingerprintCache
+from price_history import download_history, yahoo_symbol
+from stage_engine import compute_stages, stage_of, stage_value
 
 # Load .env from current directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-  raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
+def load_tickers() -> list[str]:
+    """Tracked tickers from the Supabase 'tickers' table."""
+    return [t["ticker"] for t in iter_rows("tickers", "ticker", key=("ticker",))]
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
-# Fetch tickers from Supabase
-tickers = supabase.table("tickers").select("ticker").execute().data
-TICKERS = [t["ticker"] for t in tickers]
+def update_stock(ticker: str, writer: BatchWriter | None = None, hist: pd.DataFrame | None = None,
+                 stage: tuple | None = None) -> bool:
+    """Fetch and upsert data for a single stock into Supabase.
 
-
-
-def calculate_stage(hist_data: pd.DataFrame):
+    With a writer the row is queued for a background batch upsert instead.
+    `hist` is the ticker's slice of a batched download_history() and
+    `stage` its (stage, ma_30_week) from compute_stages(); without them
+    both are computed for this ticker alone.
     """
-    Calculate Weinstein stage from price history.
-
-    Stage 1 = Basing (price below MA, MA flat)
-    Stage 2 = Advancing (price above MA, MA rising)
-    Stage 3 = Topping (price above MA, MA flat)
-    Stage 4 = Declining (price below MA, MA falling)
-    """
-    if hist_data is None or hist_data.empty:
-        return None, None
-
-    # Need >= 150 trading days (~30 weeks)
-    if len(hist_data) < 150:
-        return None, None
-
-    ma_30w = hist_data["Close"].rolling(window=150).mean()
-
-    if ma_30w.isna().all():
-        return None, None
-
-    ma_30w = ma_30w.dropna()
-    if len(ma_30w) < 150:
-        return None, None
-
-    current_price = hist_data["Close"].iloc[-1]
-    ma_current = ma_30w.iloc[-1]
-
-    # Slope over last 30 points vs 30 points before
-    try:
-        ma_slope = (ma_30w.iloc[-1] - ma_30w.iloc[-30]) / ma_30w.iloc[-30]
-    except Exception:
-        ma_slope = 0
-
-    # Determine stage
-    stage = None
-    if current_price > ma_current and ma_slope > 0.02:
-        stage = 2  # Advancing
-    elif current_price < ma_current and ma_slope < -0.02:
-        stage = 4  # Declining
-    elif current_price > ma_current:
-        stage = 3  # Topping
-    else:
-        stage = 1  # Basing
-
-    return stage, float(ma_current)
-
-
-
-
-
-def update_stock(ticker: str) -> bool:
-    """Fetch and upsert data for a single stock into Supabase."""
     try:
         print(f"Updating {ticker}...")
 
-        stock = yf.Ticker(ticker)
+        stock = yf.Ticker(yahoo_symbol(ticker))
 
         # yfinance.info is ugly but good enough for MVP
         info = stock.info
-        hist = stock.history(period="1y")
+        if hist is None:
+            hist = download_history([ticker], period="1y").history(ticker)
 
-        stage, ma_30w = calculate_stage(hist)
+        stage, ma_30w = stage if stage is not None else stage_of(hist)
 
         # Basic financials
         sales_current = info.get("totalRevenue") or 0
@@ -121,9 +74,14 @@ def update_stock(ticker: str) -> bool:
             "updated_at": datetime.utcnow().isoformat()
         }
 
+        if writer is not None:
+            writer.put(data)
+            print(f"✓ {ticker} queued")
+            return True
+
         # Upsert by ticker
         # supabase-py v2 supports on_conflict
-        res = supabase.table("stocks").upsert(data, on_conflict="ticker").execute()
+        res = get_client().table("stocks").upsert(data, on_conflict="ticker").execute()
 
         if getattr(res, "error", None):
             print(f"✗ Supabase error for {ticker}: {res.error}")
@@ -146,11 +104,30 @@ def main():
     success_count = 0
     fail_count = 0
 
-    for ticker in TICKERS:
-        if update_stock(ticker):
-            success_count += 1
-        else:
-            fail_count += 1
+    # Upserts run in the background while the next ticker is fetched;
+    # unchanged rows are skipped and changed rows send only changed columns
+    fingerprints = FingerprintCache("stocks")
+    writer = BatchWriter("stocks",
+                         lambda rows: upsert_changed(get_client(), "stocks", rows, "ticker", fingerprints),
+                         key=lambda row: row["ticker"])
+    tickers = load_tickers()
+    # One multi-symbol download per HISTORY_GROUP_SIZE tickers
+    prices = download_history(tickers, period="1y")
+    # Stage for the whole universe in one vectorized pass
+    stages = compute_stages(prices.close)
+
+    with writer:
+        for ticker in tickers:
+            if update_stock(ticker, writer, prices.history(ticker), stage_value(stages.loc[ticker])):
+                success_count += 1
+            else:
+                fail_count += 1
+
+    fingerprints.save()
+    writer.print_stats()
+    fingerprints.print_stats("stocks")
+    success_count -= writer.stats["failed"]
+    fail_count += writer.stats["failed"]
 
     print(f"\n✅ Update complete: {success_count} success, {fail_count} failed")
 
@@ -6,7 +6,12 @@ Fetches ALL metrics from Yahoo Finance
 
 import yfinance as yf
 from datetime import datetime
-from supabase import create_client
+from supabase_client import get_client, iter_rows
+from db_writer import BatchWriter, upsert_changed
+from local_cache import FingerprintCache
+from price_history import PriceCache, iter_history, window_return, yahoo_symbol
+from ohlcv_store import OHLCVStore
+from stage_engine import MA_WINDOW, MIN_BARS_FULL, SLOPE_BARS, compute_stages, stage_of, stage_value
 import os
 import pandas as pd
 from dotenv import load_dotenv
@@ -14,74 +19,30 @@ from dotenv import load_dotenv
 # Load .env from current directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+BENCHMARK = "SPY"
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY in environment.")
+# Per-run cache: the benchmark is downloaded once, not twice per ticker
+PRICES = PriceCache()
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
-
-def calculate_stage(hist_data: pd.DataFrame):
-    """
-    Calculate Weinstein stage from price history.
-    Stage 1 = Basing, 2=Advancing, 3=Topping, 4=Declining
-    """
-    if hist_data is None or hist_data.empty:
-        return None, None
-
-    if len(hist_data) < 150:
-        return None, None
-
-    ma_30w = hist_data["Close"].rolling(window=150).mean()
-
-    if ma_30w.isna().all():
-        return None, None
-
-    ma_30w = ma_30w.dropna()
-    if len(ma_30w) < 150:
-        return None, None
-
-    current_price = hist_data["Close"].iloc[-1]
-    ma_current = ma_30w.iloc[-1]
-
-    try:
-        ma_slope = (ma_30w.iloc[-1] - ma_30w.iloc[-30]) / ma_30w.iloc[-30]
-    except Exception:
-        ma_slope = 0
-
-    stage = None
-    if current_price > ma_current and ma_slope > 0.02:
-        stage = 2  # Advancing
-    elif current_price < ma_current and ma_slope < -0.02:
-        stage = 4  # Declining
-    elif current_price > ma_current:
-        stage = 3  # Topping
-    else:
-        stage = 1  # Basing
-
-    return stage, float(ma_current)
-
-
-def calculate_relative_strength(ticker: str, days: int) -> float:
+def calculate_relative_strength(ticker: str, days: int, hist: pd.DataFrame | None = None) -> float:
     """
     Calculate relative strength vs SPY over specified period.
     Returns percentage difference.
+
+    Computed from the already-loaded `hist` and the cached benchmark
+    series instead of downloading both again.
     """
     try:
-        stock = yf.Ticker(ticker)
-        spy = yf.Ticker("SPY")
-        
-        stock_hist = stock.history(period=f"{days}d")
-        spy_hist = spy.history(period=f"{days}d")
-        
-        if len(stock_hist) < 2 or len(spy_hist) < 2:
+        if hist is None:
+            hist = PRICES.get(ticker, "1y")
+        spy_hist = PRICES.get(BENCHMARK, "1y")
+
+        stock_return = window_return(hist['Close'], days)
+        spy_return = window_return(spy_hist['Close'], days)
+        if stock_return is None or spy_return is None:
             return 0.0
-        
-        stock_return = ((stock_hist['Close'].iloc[-1] / stock_hist['Close'].iloc[0]) - 1) * 100
-        spy_return = ((spy_hist['Close'].iloc[-1] / spy_hist['Close'].iloc[0]) - 1) * 100
-        
+
         rs = stock_return - spy_return
         return round(rs, 2)
     except Exception as e:
@@ -89,21 +50,22 @@ def calculate_relative_strength(ticker: str, days: int) -> float:
         return 0.0
 
 
-def fetch_all_metrics(ticker):
-    """Fetch comprehensive metrics for screener"""
+def fetch_all_metrics(ticker, hist=None, stage=None):
+    """Fetch comprehensive metrics for screener (hist/stage: from the batched run)"""
     try:
-        stock = yf.Ticker(ticker)
+        stock = yf.Ticker(yahoo_symbol(ticker))
         info = stock.info
-        hist = stock.history(period="max")  # Get all history for ATH
+        if hist is None:
+            hist = next(iter_history([ticker], period="max")).history(ticker)  # All history for ATH
         
         if len(hist) < 150:
             print(f"[WARN] Insufficient history for {ticker}")
             return None
         
         # Calculate technical indicators
-        stage, ma_30w = calculate_stage(hist)
-        rs_6mo = calculate_relative_strength(ticker, 180)
-        rs_3mo = calculate_relative_strength(ticker, 90)
+        stage, ma_30w = stage if stage is not None else stage_of(hist)
+        rs_6mo = calculate_relative_strength(ticker, 180, hist)
+        rs_3mo = calculate_relative_strength(ticker, 90, hist)
         
         # Volume metrics
         avg_volume_90d = hist['Volume'].tail(90).mean()
@@ -188,21 +150,37 @@ def fetch_all_metrics(ticker):
 
 def update_all_stocks():
     """Update all tracked stocks with comprehensive metrics"""
-    response = supabase.table("tickers").select("ticker").execute()
-    tickers = [t["ticker"] for t in response.data]
+    tickers = [t["ticker"] for t in iter_rows("tickers", "ticker", key=("ticker",))]
     
     print(f"[INFO] Updating {len(tickers)} stocks with comprehensive metrics...")
     
+    # Only changed columns are written; unchanged rows are skipped
+    fingerprints = FingerprintCache("stocks")
+    writer = BatchWriter("stocks",
+                         lambda rows: upsert_changed(get_client(), "stocks", rows, "ticker", fingerprints),
+                         key=lambda row: row["ticker"])
+    
+    # Full history (for ATH) lives in the local store; only new days are downloaded
+    store = OHLCVStore()
+    store.sync(tickers)
+    # Stage for every ticker at once from the stored closes (only the tail is needed)
+    stages = compute_stages(store.frame(tickers, "close", max(MIN_BARS_FULL, MA_WINDOW + SLOPE_BARS)))
+
     success = 0
-    for ticker in tickers:
-        data = fetch_all_metrics(ticker)
-        if data:
-            supabase.table('stocks').upsert(data, on_conflict='ticker').execute()
-            print(f"✓ {ticker}")
-            success += 1
-        else:
-            print(f"✗ {ticker}")
+    with writer:
+        for ticker in tickers:
+            data = fetch_all_metrics(ticker, store.history(ticker), stage_value(stages.loc[ticker]))
+            if data:
+                writer.put(data)
+                print(f"✓ {ticker}")
+                success += 1
+            else:
+                print(f"✗ {ticker}")
     
+    fingerprints.save()
+    success -= writer.stats["failed"]
+    fingerprints.print_stats("stocks")
+    PRICES.print_stats()
     print(f"\n[OK] Updated {success}/{len(tickers)} stocks")
 
 
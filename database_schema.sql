@@ -70,6 +70,7 @@ create table if not exists insider_summary (
   total_sold_value_90d numeric,
   net_activity_90d numeric, -- bought - sold
   verdict text, -- 'accumulating', 'neutral', 'distributing'
+  summary_measure text, -- what buys/sells hold: 'shares', 'count' or 'value'
   updated_at timestamptz default now(),
 
   constraint insider_summary_ticker_fkey
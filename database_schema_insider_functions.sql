@@ -0,0 +1,146 @@
+-- ==========================
+-- INSIDER TRANSACTION FUNCTIONS
+-- ==========================
+-- Set-based helpers called from the data pipeline via supabase.rpc().
+-- Run after database_schema.sql.
+--
+-- The pipeline calls them with the service key, so they run with the
+-- caller's rights (SECURITY INVOKER) and only service_role may execute them.
+
+-- Upsert a batch of insider transactions in one statement against the
+-- insider_transactions_unique constraint and report how many rows were
+-- inserted vs updated (xmax = 0 only for freshly inserted row versions).
+-- p_rows is a JSON array of insider_transactions rows (without id).
+CREATE OR REPLACE FUNCTION upsert_insider_transactions(p_rows jsonb)
+RETURNS TABLE (inserted integer, updated integer) AS $$
+BEGIN
+  RETURN QUERY
+  WITH batch AS (
+    -- Last row wins when the batch repeats a key (ON CONFLICT cannot touch a row twice)
+    SELECT DISTINCT ON (r.ticker, r.insider_name, r.transaction_date, r.transaction_type, r.shares) r.*
+    FROM jsonb_populate_recordset(null::insider_transactions, p_rows) WITH ORDINALITY AS r
+    ORDER BY r.ticker, r.insider_name, r.transaction_date, r.transaction_type, r.shares, ordinality DESC
+  ),
+  written AS (
+    INSERT INTO insider_transactions (
+      ticker, insider_name, insider_title, transaction_date, transaction_type,
+      shares, price_per_share, total_value, filing_date
+    )
+    SELECT ticker, insider_name, insider_title, transaction_date, transaction_type,
+           shares, price_per_share, total_value, filing_date
+    FROM batch
+    ON CONFLICT ON CONSTRAINT insider_transactions_unique DO UPDATE SET
+      insider_title = excluded.insider_title,
+      price_per_share = excluded.price_per_share,
+      total_value = excluded.total_value,
+      filing_date = excluded.filing_date
+    RETURNING (xmax = 0) AS is_insert
+  )
+  SELECT count(*) FILTER (WHERE is_insert)::integer,
+         count(*) FILTER (WHERE NOT is_insert)::integer
+  FROM written;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Which measure each summary row was computed with, so a verifier only
+-- compares rows written under its own rules (added after database_schema.sql).
+ALTER TABLE insider_summary ADD COLUMN IF NOT EXISTS summary_measure text;
+
+-- Rebuild insider_summary for every ticker in one set-based statement.
+--   p_days               window length (transaction_date >= today - p_days)
+--   p_measure            what buys_90d / sells_90d hold and how net is computed:
+--                          'shares' - summed shares, net = buys - sells
+--                          'count'  - number of trades, net = buys - sells
+--                          'value'  - number of trades, net = bought - sold value
+--   p_verdict_threshold  net above +threshold is 'accumulating', below -threshold 'distributing'
+--   p_all_tickers        also write (zero) rows for tracked tickers with no recent trades
+--   p_tickers            restrict the refresh to these tickers (NULL = all); each one
+--                        listed gets a row, zeroed once its trades age out of the window
+-- Returns the number of summary rows written.
+CREATE OR REPLACE FUNCTION refresh_insider_summary(
+  p_days integer DEFAULT 90,
+  p_measure text DEFAULT 'value',
+  p_verdict_threshold numeric DEFAULT 0,
+  p_all_tickers boolean DEFAULT false,
+  p_tickers text[] DEFAULT NULL
+)
+RETURNS integer AS $$
+DECLARE
+  written integer;
+BEGIN
+  IF p_measure NOT IN ('shares', 'count', 'value') THEN
+    RAISE EXCEPTION 'Unknown measure %, expected shares, count or value', p_measure;
+  END IF;
+
+  WITH agg AS (
+    SELECT ticker,
+           count(*) FILTER (WHERE transaction_type = 'buy') AS buy_count,
+           count(*) FILTER (WHERE transaction_type = 'sell') AS sell_count,
+           coalesce(sum(shares) FILTER (WHERE transaction_type = 'buy'), 0) AS buy_shares,
+           coalesce(sum(shares) FILTER (WHERE transaction_type = 'sell'), 0) AS sell_shares,
+           coalesce(sum(total_value) FILTER (WHERE transaction_type = 'buy'), 0) AS bought_value,
+           coalesce(sum(total_value) FILTER (WHERE transaction_type = 'sell'), 0) AS sold_value
+    FROM insider_transactions
+    WHERE transaction_date >= current_date - p_days
+      AND (p_tickers IS NULL OR ticker = ANY (p_tickers))
+    GROUP BY ticker
+  ),
+  universe AS (
+    SELECT ticker FROM agg
+    UNION
+    SELECT t.ticker FROM tickers t
+    JOIN stocks s ON s.ticker = t.ticker  -- insider_summary references stocks
+    WHERE p_all_tickers AND (p_tickers IS NULL OR t.ticker = ANY (p_tickers))
+    UNION
+    -- Explicitly requested tickers are always rewritten, so stale rows get zeroed
+    SELECT s.ticker FROM stocks s
+    WHERE p_tickers IS NOT NULL AND s.ticker = ANY (p_tickers)
+  ),
+  totals AS (
+    SELECT u.ticker,
+           CASE WHEN p_measure = 'shares' THEN coalesce(a.buy_shares, 0)
+                ELSE coalesce(a.buy_count, 0) END AS buys,
+           CASE WHEN p_measure = 'shares' THEN coalesce(a.sell_shares, 0)
+                ELSE coalesce(a.sell_count, 0) END AS sells,
+           coalesce(a.bought_value, 0) AS bought_value,
+           coalesce(a.sold_value, 0) AS sold_value
+    FROM universe u
+    LEFT JOIN agg a ON a.ticker = u.ticker
+  ),
+  scored AS (
+    SELECT *,
+           CASE WHEN p_measure = 'value' THEN bought_value - sold_value
+                ELSE buys - sells END AS net
+    FROM totals
+  )
+  INSERT INTO insider_summary (
+    ticker, buys_90d, sells_90d, total_bought_value_90d, total_sold_value_90d,
+    net_activity_90d, verdict, summary_measure, updated_at
+  )
+  SELECT ticker, buys, sells, bought_value, sold_value, net,
+         CASE WHEN net > p_verdict_threshold THEN 'accumulating'
+              WHEN net < -p_verdict_threshold THEN 'distributing'
+              ELSE 'neutral' END,
+         p_measure,
+         now()
+  FROM scored
+  ON CONFLICT (ticker) DO UPDATE SET
+    buys_90d = excluded.buys_90d,
+    sells_90d = excluded.sells_90d,
+    total_bought_value_90d = excluded.total_bought_value_90d,
+    total_sold_value_90d = excluded.total_sold_value_90d,
+    net_activity_90d = excluded.net_activity_90d,
+    verdict = excluded.verdict,
+    summary_measure = excluded.summary_measure,
+    updated_at = excluded.updated_at;
+
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+REVOKE EXECUTE ON FUNCTION upsert_insider_transactions(jsonb) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION refresh_insider_summary(integer, text, numeric, boolean, text[])
+  FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION upsert_insider_transactions(jsonb) TO service_role;
+GRANT EXECUTE ON FUNCTION refresh_insider_summary(integer, text, numeric, boolean, text[]) TO service_role;